@@ -1,23 +1,23 @@
 # import the libraries 
-import pandas as pd
-import plotly.express as px
-import plotly.subplots as sp
 import streamlit as st
 
-# import the dataset 
-video_game = pd.read_csv('streamlit_app/Data/Video_Games.csv')
+from figures import draw_figures, region_totals, show_figure, start_figures
+from instrumentation import finish_run, start_run
+from sales_cube import load_cube
 
-## clean the dataset for analysis
 
-# in this analysis we will only be looking for video games sales
-# drop columns from index 10 to 16 becaus we won't use them for this analysis
-video_game.drop(video_game.iloc[:,10:16], inplace=True, axis=1)
-# we will drop these two rows as is will not have a big impact on the analysis
-video_game.dropna(subset=['Name'], inplace=True)
-# drop the rows as it won't have a big impact on the dataframe
-video_game.dropna(subset=['Publisher'], inplace=True)
-# replace missing years with the median value
-video_game['Year_of_Release'].fillna((video_game['Year_of_Release'].median()), inplace=True)
+def lazy_section(label, render, key, expanded=False):
+    # show a section of the analysis in an expander, its data and figures are only
+    # computed when the expander is open and are cached per version of the dataset
+    section = st.expander(label, expanded=expanded, key=key, on_change='rerun')
+    if section.open:
+        with section:
+            render()
+
+
+# measure the stages of the run when it is instrumented, and forget the figures a stopped run did not draw
+start_run('Analysis')
+start_figures()
 
 # create a markdown to center the title
 st.markdown("<h2 style='text-align: center; color: black;'>Video Game Sales Analysis </h2>", 
@@ -82,41 +82,31 @@ we can have a good overview of the gaming console market from 1980 to 2020. The
 and therefore may not be a perfect reflection of the current market.
 ''')
 
-# create a header
-st.header('Which Region is the biggest market?')
 
-# calculate the sum of sales for each region and global sales
-# multiply by 1000000 as the column is in millions
-NA_Sales = video_game['NA_Sales'].sum()*1000000
-EU_Sales = video_game['EU_Sales'].sum()*1000000
-JP_Sales = video_game['JP_Sales'].sum()*1000000
-Other_Sales = video_game['Other_Sales'].sum()*1000000
-Global_Sales = video_game['Global_Sales'].sum()*1000000
+# create the section about the regions
+def regions_section():
+    # calculate the sum of sales for each region and global sales
+    # multiply by 1000000 as the column is in millions
+    NA_Sales, EU_Sales, JP_Sales, Other_Sales, Global_Sales = region_totals(load_cube())
 
-# create a writing section
-st.write('''To have a good overview of the market on a global scale, we will look at the overall sales and see if 
+    # create a writing section
+    st.write('''To have a good overview of the market on a global scale, we will look at the overall sales and see if 
 a region stands out from another. We can summarize the market with the five key figures below:
 ''')
 
-# print the result 
-st.write("- The North American market represent {:,.0f} copies sold".format(NA_Sales))
-st.write("- The European market represent {:,.0f} copies sold".format(EU_Sales))
-st.write("- The Japanese market represent {:,.0f} copies sold".format(JP_Sales))
-st.write("- The Other market represent {:,.0f} copies sold".format(Other_Sales))
-st.write("- The Global market represent {:,.0f} copies sold".format(Global_Sales))
+    # print the result 
+    st.write("- The North American market represent {:,.0f} copies sold".format(NA_Sales))
+    st.write("- The European market represent {:,.0f} copies sold".format(EU_Sales))
+    st.write("- The Japanese market represent {:,.0f} copies sold".format(JP_Sales))
+    st.write("- The Other market represent {:,.0f} copies sold".format(Other_Sales))
+    st.write("- The Global market represent {:,.0f} copies sold".format(Global_Sales))
 
 
-# create a bar chart to show total sales by region
-fig_2 = px.bar(x=['NA Sales', 'EU Sales', 'JP Sales', 'Other Sales', 'Global Sales'], 
-            y=[NA_Sales, EU_Sales, JP_Sales, Other_Sales, Global_Sales], 
-            labels={'x':'Region', 'y':'Sales'},
-            title='Sales by Region',
-            color=[NA_Sales,EU_Sales,JP_Sales,Other_Sales,Global_Sales])
-# show the plot
-st.plotly_chart(fig_2)
+    # show a bar chart of total sales by region
+    show_figure('sales_by_region')
 
-# create a writing section
-st.write('''At first glance we can already see that the market is leaded by the North American market, 
+    # create a writing section
+    st.write('''At first glance we can already see that the market is leaded by the North American market, 
 that represent almost 50% of the global sales, with more than 4 billion copies sold. The second market, 
 the European one, holds 30% of the shares, and Japan itself represent 15% of the global sales. These 3 regions 
 are accountable for more than 90% of the global sales. We can now clearly understand why the top players in the industry 
@@ -125,52 +115,42 @@ when it's comes to ensuring fair competition, like we are seeing now with the me
 Activison-Blizzard-King.
 ''')
 
-# create a pie chart to show the share of every region in %
-fig_3 = px.pie(values=[NA_Sales, EU_Sales, JP_Sales, Other_Sales], 
-            names=['NA Sales', 'EU Sales', 'JP Sales', 'Other Sales'], 
-            title='Share of Sales by Region')
-# add a title to the legend
-fig_3.update_layout(legend_title='Market')
-# show the plot
-st.plotly_chart(fig_3)
+    # show a pie chart of the share of every region in %
+    show_figure('region_share')
 
-# create a header
-st.header('Evolution of sales throughout the years')
 
-# create a writing section
-st.write('''Now that we know the volume sold, we can legitimately ask ourselves: how have these sales been made over time?
+lazy_section('Which Region is the biggest market?', regions_section, key='regions', expanded=True)
+
+
+# create the section about the evolution of sales
+def years_section():
+    # create a writing section
+    st.write('''Now that we know the volume sold, we can legitimately ask ourselves: how have these sales been made over time?
 As we can see with the line plot below, the first big gap was reached in 1996, with 200 millions copies sold, which was 
 a gigantic step considering the numbers did not reach 100 millions just one year before. The trend has been positive every year 
 Until it reached it's top in 2007, with almost 700 million copies sold, this a 350% increase in just 10 years! Since this date, 
 the sales has been dropping every year.
 ''')
 
-# count the sum of sales grouped by years
-sales_year = video_game.groupby('Year_of_Release').sum().reset_index()
+    # show a lineplot of sales by year and region
+    show_figure('sales_by_year')
 
-# create lineplot of sales by year and region
-fig_4 = px.line(sales_year, x='Year_of_Release', y=['NA_Sales', 'EU_Sales', 'JP_Sales', 'Other_Sales', 'Global_Sales'],
-            title='Sales by Year')
-# update the axis titles and legend
-fig_4.update_layout(xaxis_title='Year of Release',
-                yaxis_title='Copies in millions',
-                legend_title='Market')
-# show the plot
-st.plotly_chart(fig_4)
-
-# create a writing section
-st.write('''It is interesting to see the evolution of sales per region too. The North American market was almost the only one 
+    # create a writing section
+    st.write('''It is interesting to see the evolution of sales per region too. The North American market was almost the only one 
 present in the early 80's and has been since then the biggest market in terms of volume sold. The European and Japan markets, however, 
 took more time to lift off, in the mid/late 90's. We can assume this big step in terms of sales coincides with the arrival 
 of the Nintendo 64, the famous PlayStation 1, and the iconic Game Boy Color. We have to wait until the year 2000 for the position 
 of the regions as we know it today to become established.
 ''')
 
-# create a header
-st.header('Which platform performed the best?')
 
-# create a writing section
-st.write('''Now that we have the figures in front of us, it can be no mistakes, the PlayStation 2 is the console that outperformed 
+lazy_section('Evolution of sales throughout the years', years_section, key='years')
+
+
+# create the section about the platforms
+def platforms_section():
+    # create a writing section
+    st.write('''Now that we have the figures in front of us, it can be no mistakes, the PlayStation 2 is the console that outperformed 
 the other consoles in terms of volume of game unit sold, with no less than 1,252 million copies sold on this platform only. Followed 
 next by the Xbox 360 with 970 million copies sold on this platform, and the PlayStation 3 and the Nintendo Wii with respectively 
 938 million and 907 million copies sold on these platforms. We can see there is a huge gap between the first and the second platform, 
@@ -179,21 +159,11 @@ the sales on platforms like, for the PlayStation 4 and Xbox One, are odd when we
 units.
 ''')
 
-# count the sum of sales per platform and sort by global sales
-sales_platform = video_game.groupby('Platform').sum().sort_values('Global_Sales', ascending=False).reset_index()
-
-# create bar plot for global sales per platform
-fig_5 = px.bar(sales_platform, x='Platform', y='Global_Sales', 
-            title='Total Sales by Platform',
-            color='Global_Sales')
-# update axis title
-fig_5.update_layout(yaxis_title='Copies in millions')
-fig_5.update_xaxes(tickangle=45)
-# show plot
-st.plotly_chart(fig_5)
+    # show a bar plot of global sales per platform
+    show_figure('platform_sales')
 
-# create a writing section
-st.write('''It is also very interesting to look at each region more carefully, as we see the figures are not the same. The 
+    # create a writing section
+    st.write('''It is also very interesting to look at each region more carefully, as we see the figures are not the same. The 
 North American market for example was leaded by the Xbox 360, with 600 million games sold (nearly 70% of the global sales), followed 
 by the PlayStation 2 and the Nintendo Wii. The European market, however, was leader by the PlayStation 2, with 338 million games sold 
 (almost 25% of the global sales), followed by the PlayStation 3 and the Xbox 360. The Japan market is in a completely different 
@@ -201,36 +171,17 @@ position, leaded by the Nintendo DS (first handheld device to be in the top) wit
 and the PlayStation 2.
 ''')
 
-# count the sum of sales by region per platform
-platform_NA = video_game.groupby('Platform')[['NA_Sales']].sum().sort_values('NA_Sales', ascending=False).reset_index()
-platform_EU = video_game.groupby('Platform')[['EU_Sales']].sum().sort_values('EU_Sales', ascending=False).reset_index()
-platform_JP = video_game.groupby('Platform')[['JP_Sales']].sum().sort_values('JP_Sales', ascending=False).reset_index()
-platform_Other = video_game.groupby('Platform')[['Other_Sales']].sum().sort_values('Other_Sales', ascending=False).reset_index()
-
-# initialize a subplot
-fig_6 = sp.make_subplots(
-    rows=2, cols=2,
-    subplot_titles=('NA Sales', 'EU Sales', 'JP Sales', 'Other Sales'),
-)
-# add the four bar plots
-fig_6.add_trace(px.bar(platform_NA, x='Platform', y='NA_Sales', color='NA_Sales').data[0], row=1, col=1)
-fig_6.add_trace(px.bar(platform_EU, x='Platform', y='EU_Sales', color='EU_Sales').data[0], row=1, col=2)
-fig_6.add_trace(px.bar(platform_JP, x='Platform', y='JP_Sales', color='JP_Sales').data[0], row=2, col=1)
-fig_6.add_trace(px.bar(platform_Other, x='Platform', y='Other_Sales', color='Other_Sales').data[0], row=2, col=2)
-# update the title and the dimensions
-fig_6.update_layout(height=600, width=950, 
-                    title_text="Video Game Sales by Platform",
-                yaxis_title='Copies in millions')
-# update angle of x axis
-fig_6.update_xaxes(tickangle=45)
-# show the plot
-st.plotly_chart(fig_6)
+    # show the bar plots of sales per platform for each region
+    show_figure('platform_sales_by_region')
 
-# create a header
-st.header('Who are the top players on the market?')
 
-# create a writing section
-st.write('''A video game publisher is a company that publishes video games that have been developed either internally by the 
+lazy_section('Which platform performed the best?', platforms_section, key='platforms')
+
+
+# create the section about the publishers
+def publishers_section():
+    # create a writing section
+    st.write('''A video game publisher is a company that publishes video games that have been developed either internally by the 
 publisher or externally by a video game developer. 
 
 That said, we can see who are the top players on the video game market in terms of publishing games that publish games 
@@ -243,20 +194,11 @@ ranking, as we can see with Japan (Nintendo, Sony) at the top, and France (Ubiso
 copies sold. This ranking makes us understand the power of the North American market as a propositional force.
 ''')
 
-# count the sum of sales by publisher sorted by descending
-publisher_sales = video_game.groupby('Publisher').sum().sort_values('Global_Sales', ascending=False).reset_index()[:20]
+    # show a bar plot of the top 20 publishers by global sales
+    show_figure('top_publishers')
 
-# create bar plot of top 20 publishers by global sales
-fig_7 = px.bar(publisher_sales, x='Publisher', y='Global_Sales',
-            title='Top 20 publishers',color='Global_Sales')
-# update y axis title
-fig_7.update_layout(yaxis_title='Copies in millions')
-fig_7.update_xaxes(tickangle=45)
-# show plot
-st.plotly_chart(fig_7)
-
-# create a writing section
-st.write('''Like for the platform, every region has its own specificities when it's about publishers. Nintendo deserves its 
+    # create a writing section
+    st.write('''Like for the platform, every region has its own specificities when it's about publishers. Nintendo deserves its 
 leadership position, with an overwhelming presence in all markets, even in the North American one with more than 800 million 
 copies sold. The North American and European have a lot in common when it's about publishers, which could make sense in the 
 way our cultures shares a lot of similarities, and publisher like Electronic Arts, Activision or Ubisoft are focusing on these 
@@ -269,52 +211,27 @@ more than 450 million copies sold, leaving the rest with only mouthfuls of bread
 copies and is the second player on the local market.
 ''')
 
-# count the sum of sales by publisher per region
-publisher_NA = video_game.groupby('Publisher')[['NA_Sales']].sum().sort_values('NA_Sales', ascending=False).reset_index()[:20]
-publisher_EU = video_game.groupby('Publisher')[['EU_Sales']].sum().sort_values('EU_Sales', ascending=False).reset_index()[:20]
-publisher_JP = video_game.groupby('Publisher')[['JP_Sales']].sum().sort_values('JP_Sales', ascending=False).reset_index()[:20]
-publisher_Other = video_game.groupby('Publisher')[['Other_Sales']].sum().sort_values('Other_Sales', ascending=False).reset_index()[:20]
-
-# initialize a subplot
-fig_8 = sp.make_subplots(
-    rows=2, cols=2,
-    subplot_titles=('NA Sales', 'EU Sales', 'JP Sales', 'Other Sales')
-)
-# add the bar plots 
-fig_8.add_trace(px.bar(publisher_NA, x='Publisher', y='NA_Sales', color='NA_Sales').data[0], row=1, col=1)
-fig_8.add_trace(px.bar(publisher_EU, x='Publisher', y='EU_Sales', color='EU_Sales').data[0], row=1, col=2)
-fig_8.add_trace(px.bar(publisher_JP, x='Publisher', y='JP_Sales', color='JP_Sales').data[0], row=2, col=1)
-fig_8.add_trace(px.bar(publisher_Other, x='Publisher', y='Other_Sales', color='Other_Sales').data[0], row=2, col=2)
-# update the dimensions and title
-fig_8.update_layout(height=1200, width=950, title_text="Top 20 publishers by Region",
-                    yaxis_title='Copies in millions')
-fig_8.update_xaxes(tickangle=45)
-# show plot
-st.plotly_chart(fig_8)
+    # show the bar plots of the top 20 publishers for each region
+    show_figure('top_publishers_by_region')
 
-# create a header
-st.header('Which is the most represented genre?')
 
-# create a writing section
-st.write('''With 12 unique genres, we can see that the genre distribution follows a rather logical curve. The 
+lazy_section('Who are the top players on the market?', publishers_section, key='publishers')
+
+
+# create the section about the genres
+def genres_section():
+    # create a writing section
+    st.write('''With 12 unique genres, we can see that the genre distribution follows a rather logical curve. The 
 leader is Action games, with more than 1,700 million games sold, followed by Sport games, with 1,300 copies sold and 
 Shooter games are closing the top 3, with 1,000 million units sold. The gap between the top 1 and the last genre is 
 quite large, with Strategy games selling 10 times less than Action games.
 ''')
 
-# count the sum of sales by genre sorted by global sales
-genre_sales = video_game.groupby('Genre').sum().sort_values('Global_Sales', ascending=False).reset_index()
-
-# create bar plot 
-fig_9 = px.bar(genre_sales, x='Genre', y='Global_Sales',
-            title='Global Sales by Genre', color='Global_Sales')
-# update y axis title
-fig_9.update_yaxes(title='Copies in millions')
-# show the plot
-st.plotly_chart(fig_9)
+    # show a bar plot of global sales by genre
+    show_figure('genre_sales')
 
-# create a writing section
-st.write('''Once again, the disparities between eastern and western markets are being seen here. The top 3 genres are 
+    # create a writing section
+    st.write('''Once again, the disparities between eastern and western markets are being seen here. The top 3 genres are 
 exactly the same in the North American region and in the European market, which are Action, Sports and Shooter. Although 
 the North American market is still the leader, Europe is not far behind with 878 millions and 519 million sales respectively for 
 Action games, 683 millions and 376 million copies sold for Sports games, 592 million and 317 million unit sold for Shooter games. 
@@ -322,83 +239,46 @@ Japan is still in the same vein, with a massive majority of games that are Role-
 and Sport games with respectively 160 million copies and 135 million copies sold.
 ''')
 
-# count the sum of sales by genre per region
-genre_NA = video_game.groupby('Genre')[['NA_Sales']].sum().sort_values('NA_Sales', ascending=False).reset_index()
-genre_EU = video_game.groupby('Genre')[['EU_Sales']].sum().sort_values('EU_Sales', ascending=False).reset_index()
-genre_JP = video_game.groupby('Genre')[['JP_Sales']].sum().sort_values('JP_Sales', ascending=False).reset_index()
-genre_Other = video_game.groupby('Genre')[['Other_Sales']].sum().sort_values('Other_Sales', ascending=False).reset_index()
-
-# initialize the subplot
-fig_10 = sp.make_subplots(
-    rows=2, cols=2,
-    subplot_titles=('NA Sales', 'EU Sales', 'JP Sales', 'Other Sales')
-)
-# add the bar plots
-fig_10.add_trace(px.bar(genre_NA, x='Genre', y='NA_Sales', color='NA_Sales').data[0], row=1, col=1)
-fig_10.add_trace(px.bar(genre_EU, x='Genre', y='EU_Sales', color='EU_Sales').data[0], row=1, col=2)
-fig_10.add_trace(px.bar(genre_JP, x='Genre', y='JP_Sales', color='JP_Sales').data[0], row=2, col=1)
-fig_10.add_trace(px.bar(genre_Other, x='Genre', y='Other_Sales', color='Other_Sales').data[0], row=2, col=2)
-# update dimensions and title
-fig_10.update_layout(height=900, width=950, title_text="Sales by Genre per Region",
-                    yaxis_title='Copies in millions')
-fig_10.update_xaxes(tickangle=45)
-# show the plot
-st.plotly_chart(fig_10)
+    # show the bar plots of sales by genre for each region
+    show_figure('genre_sales_by_region')
 
-# create a writing section
-st.write('''This sunburst plot allows us to have a more visual idea of the distribution of game genres according to consoles. 
+    # create a writing section
+    st.write('''This sunburst plot allows us to have a more visual idea of the distribution of game genres according to consoles. 
 We see that for the top 3 consoles the Action, Shooter and Sport genres highly represented.
 ''')
 
-# create a sunburst of genres per platform
-fig_11 = px.sunburst(video_game, path=['Platform', 'Genre'],
-                values='Global_Sales', title='Genre distribution by platform')
-# show the plot
-st.plotly_chart(fig_11)
+    # show a sunburst of genres per platform
+    show_figure('genre_by_platform')
 
-# create a header
-st.header('What about the games?')
 
-# create a writing section
-st.write('''With a no-contest, Wii Sports outperforms every other game in terms of sales, with no less than 82 million 
+lazy_section('Which is the most represented genre?', genres_section, key='genres')
+
+
+# create the section about the games
+def games_section():
+    # create a writing section
+    st.write('''With a no-contest, Wii Sports outperforms every other game in terms of sales, with no less than 82 million 
 copies sold! This is more than twice the amount of sales obtained by the second game, Super Mario Bros., with 40 million 
 units sold. The top 5 games is ruled by Japanese made games, and we have to wait for the sixth place with the entrance 
 of Tetris, and it's 30 millions copies sold for a western game. Out of 20 games, 14 of them comes from Japanese publishers, 
 which shows the importance of this market, as a producer, in relation to the global video game scene.
 ''')
 
-# top 20 games sorted by global sales
-top_games = video_game.sort_values('Global_Sales', ascending=False)[:20]
+    # show a bar plot of the top 20 games by global sales
+    show_figure('top_games')
 
-# create bar plot of sales per game
-fig_12 = px.bar(top_games, x='Name', y='Global_Sales', 
-                title='Top 20 Games by Global Sales', color='Global_Sales')
-# update y axis title
-fig_12.update_layout(yaxis_title='Copies in millions',
-                    xaxis_title='Game')
-fig_12.update_xaxes(tickangle=45)
-# show plot
-st.plotly_chart(fig_12)
-
-# create a writing section
-st.write('''Once again, when we look at the distribution of the games according to their genre, we see the domination 
+    # create a writing section
+    st.write('''Once again, when we look at the distribution of the games according to their genre, we see the domination 
 of Nintendo games, especially Sports games for the Wii console. Surprisingly, only two games in the top 20 are Action 
 games, even if this is the leading genre in terms of global sales. Most of the games in the top 20 most sold are not part 
 of the top 3 most selling genres. Which means for some genres, like Sports, only a few games made most of the sales.
 ''')
 
-# create a bar plot of sales top 20 games by genre
-fig_13 = px.bar(top_games, x='Name', y='Global_Sales', 
-            title='Top 20 Games by Global Sales by Genre', color='Genre')
-# update axis titles
-fig_13.update_layout(xaxis_title='Game',
-                    yaxis_title='Copies in millions')
-fig_13.update_xaxes(tickangle=45)
-# show plot
-st.plotly_chart(fig_13)
+    # show a bar plot of the top 20 games colored by genre
+    show_figure('top_games_by_genre')
 
-# create a writing section
-st.write('''Like for every regional analysis until now, the top-selling games make no exception. The supremacy of 
+    # create a writing section
+    st.write('''Like for every regional analysis until now, the top-selling games make no exception. The supremacy of 
 Wii Sports can be seen on the North America and European markets with respectively 41 million copies and 28 million copies 
 sold, which represent 85% of the sales only on these two regions. As strange as it can be, the game doesn't even appear 
 on the top 20 games of Japanese region.
@@ -410,28 +290,11 @@ The Japanese market on the other hand has almost no similarities with other mark
 just a few different franchises, the most famous being Pokémon and Mario games.
 ''')
 
-# count the sum of sales by region
-game_NA = video_game.groupby('Name')[['NA_Sales']].sum().sort_values('NA_Sales', ascending=False).reset_index()[:20]
-game_EU = video_game.groupby('Name')[['EU_Sales']].sum().sort_values('EU_Sales', ascending=False).reset_index()[:20]
-game_JP = video_game.groupby('Name')[['JP_Sales']].sum().sort_values('JP_Sales', ascending=False).reset_index()[:20]
-game_Other = video_game.groupby('Name')[['Other_Sales']].sum().sort_values('Other_Sales', ascending=False).reset_index()[:20]
-
-# initialize a subplot
-fig_14 = sp.make_subplots(
-    rows=2, cols=2,
-    subplot_titles=('NA Sales', 'EU Sales', 'JP Sales', 'Other Sales')
-)
-# add plots
-fig_14.add_trace(px.bar(game_NA, x='Name', y='NA_Sales', color='NA_Sales').data[0], row=1, col=1)
-fig_14.add_trace(px.bar(game_EU, x='Name', y='EU_Sales', color='EU_Sales').data[0], row=1, col=2)
-fig_14.add_trace(px.bar(game_JP, x='Name', y='JP_Sales', color='JP_Sales').data[0], row=2, col=1)
-fig_14.add_trace(px.bar(game_Other, x='Name', y='Other_Sales', color='Other_Sales').data[0], row=2, col=2)
-# update dimensions and titles
-fig_14.update_layout(height=1200, width=1000, title_text="Top 20 Games by Region",
-                    yaxis_title='Copies in millions')
-fig_14.update_xaxes(tickangle=45)
-# show plot
-st.plotly_chart(fig_14)
+    # show the bar plots of the top 20 games for each region
+    show_figure('top_games_by_region')
+
+
+lazy_section('What about the games?', games_section, key='games')
 
 # create a header
 st.header('Conclusion')
@@ -449,3 +312,9 @@ some figures to keep in mind:
 - Wii Sports is the most sold game, followed by Super Mario Bros. and Mario Kart Wii
 - Japan has a very important place in the video game market, even for a country with a limited local market
 ''')
+
+# draw the figures of the open sections in their place, as soon as each is ready
+draw_figures()
+
+# show the measures of the run in the sidebar when it is instrumented
+finish_run()
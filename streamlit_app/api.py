@@ -0,0 +1,202 @@
+# import the libraries
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+
+from data_loader import DATA_PATH, file_fingerprint
+from game_entities import read_or_build_game_entities
+from sales_cube import RANKING_LIMITS, REGIONS, ranking, read_or_build_cube, region_table
+
+# the rankings served by the api: endpoint -> (dimension, number of values returned by default, None for all)
+# the games are the entities of the top games of the analysis page, the names are the sales summed by exact
+# name, a game sold on several platforms or under several names is split there
+RANKINGS = {
+    'platforms': ('Platform', None),
+    'publishers': ('Publisher', 20),
+    'genres': ('Genre', None),
+    'games': (None, 20),
+    'names': ('Name', 20),
+}
+# encoded responses kept per version of the dataset, the least recently used are dropped past this number
+MAX_CACHED_RESPONSES = 512
+UNIT = 'millions of copies'
+# an entity tag of If-None-Match, weak or strong, or the * matching any version
+ENTITY_TAG = re.compile(r'\*|(?:W/)?"[^"]*"')
+
+
+def records(table):
+    # rows of a table as json objects, the sales rounded to the 2 decimals of the source
+    table = table.round({region: 2 for region in REGIONS})
+    columns = [table[column].tolist() for column in table.columns]
+    return [dict(zip(table.columns, row)) for row in zip(*columns)]
+
+
+def totals_payload(cube):
+    # total sales of every region, like the first chart of the analysis
+    return {'unit': UNIT, 'totals': {region: round(float(cube['totals'][region]), 2) for region in REGIONS}}
+
+
+def years_payload(cube):
+    # sales of every region per year of release
+    return {'unit': UNIT, 'years': records(region_table(cube, 'Year_of_Release'))}
+
+
+def ranking_payload(cube, dimension, region, n):
+    # sales of one region per value of the dimension, by descending sales
+    return {'unit': UNIT, 'dimension': dimension, 'region': region,
+            'values': records(ranking(cube, dimension, region, n))}
+
+
+def games_payload(entities, region, n):
+    # sales of one region per game with the platforms it sold on, by descending sales
+    return {'unit': UNIT, 'dimension': 'Name', 'region': region,
+            'values': records(entities.top(region, n)[['Name', 'Platforms', region]])}
+
+
+def encode(payload):
+    # the json body, its gzip version and their entity tags, computed once per cached response
+    body = json.dumps(payload, separators=(',', ':')).encode()
+    digest = hashlib.sha1(body).hexdigest()
+    return {'identity': ('"{}"'.format(digest), body), 'gzip': ('"{}-gzip"'.format(digest), gzip.compress(body, 6))}
+
+
+class CubeStore:
+    # the cube of the current version of the dataset and the responses encoded from it, a new version of the file
+    # is detected on the next request and replaces both, the game entities are read by the first ranking of games
+
+    def __init__(self, path=DATA_PATH, max_responses=MAX_CACHED_RESPONSES):
+        self.path = path
+        self.max_responses = max_responses
+        self.fingerprint = None
+        self.cube = None
+        self.entities = None
+        self.responses = OrderedDict()
+
+    def current(self):
+        fingerprint = file_fingerprint(self.path)
+        if fingerprint != self.fingerprint:
+            # rare, the event loop waits while the cube is read once for the new version
+            self.cube = read_or_build_cube(self.path)
+            self.entities = None
+            self.fingerprint = fingerprint
+            self.responses.clear()
+        return self.cube
+
+    def game_entities(self):
+        # the entities of the version of the current cube
+        if self.entities is None:
+            self.entities = read_or_build_game_entities(self.path)
+        return self.entities
+
+    def response(self, key, payload):
+        # the encoded response of the key, payload(cube) builds it the first time
+        cube = self.current()
+        if key in self.responses:
+            self.responses.move_to_end(key)
+        else:
+            self.responses[key] = encode(payload(cube))
+            if len(self.responses) > self.max_responses:
+                self.responses.popitem(last=False)
+        return self.responses[key]
+
+
+def error(status, message):
+    return Response(json.dumps({'error': message}), status_code=status, media_type='application/json')
+
+
+def accepts_gzip(accept_encoding):
+    # gzip is accepted when it is listed, or covered by *, with a quality above 0, "gzip;q=0" refuses it
+    qualities = {}
+    for coding in accept_encoding.split(','):
+        name, _, parameters = coding.partition(';')
+        quality = 1.0
+        for parameter in parameters.split(';'):
+            key, _, value = parameter.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+    return qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0))) > 0
+
+
+def is_known(etag, if_none_match):
+    # the weak comparison of If-None-Match: a tag matches whether it is weak or strong, * matches any version
+    tags = ENTITY_TAG.findall(if_none_match)
+    return '*' in tags or etag in [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+
+
+def respond(request, encoded):
+    # gzip when the client accepts it, and 304 without a body when the client already has this version
+    encoding = 'gzip' if accepts_gzip(request.headers.get('accept-encoding', '')) else 'identity'
+    etag, body = encoded[encoding]
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+    if encoding == 'gzip':
+        headers['Content-Encoding'] = 'gzip'
+    if is_known(etag, request.headers.get('if-none-match', '')):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type='application/json', headers=headers)
+
+
+def create_app(path=None):
+    # the dataset is read from the environment when no path is given, like in the worker processes
+    store = CubeStore(path or os.environ.get('VIDEO_GAMES_DATA', DATA_PATH))
+
+    async def totals(request):
+        return respond(request, store.response(('totals',), totals_payload))
+
+    async def years(request):
+        return respond(request, store.response(('years',), years_payload))
+
+    async def rankings(request):
+        name = request.path_params['ranking']
+        if name not in RANKINGS:
+            return error(404, 'unknown ranking {}, use one of {}'.format(name, ', '.join(RANKINGS)))
+        dimension, n = RANKINGS[name]
+        region = request.query_params.get('region', 'Global_Sales')
+        if region not in REGIONS:
+            return error(400, 'unknown region {}, use one of {}'.format(region, ', '.join(REGIONS)))
+        if 'n' in request.query_params:
+            try:
+                n = int(request.query_params['n'])
+            except ValueError:
+                n = 0
+            if n < 1:
+                return error(400, 'n must be a positive integer')
+        if dimension is None:
+            return respond(request, store.response(('games', region, n),
+                                                   lambda cube: games_payload(store.game_entities(), region, n)))
+        # the cube keeps a limited number of values of some dimensions
+        if dimension in RANKING_LIMITS:
+            n = min(n, RANKING_LIMITS[dimension])
+        return respond(request, store.response(('ranking', dimension, region, n),
+                                               lambda cube: ranking_payload(cube, dimension, region, n)))
+
+    return Starlette(routes=[
+        Route('/api/totals', totals),
+        Route('/api/years', years),
+        Route('/api/{ranking}', rankings),
+    ])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the sales aggregates of the analysis as json over http.')
+    parser.add_argument('--path', default=DATA_PATH, help='dataset to serve, csv or parquet')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8000, help='port to listen on')
+    parser.add_argument('--workers', type=int, default=1, help='number of server processes')
+    args = parser.parse_args()
+    # the worker processes build their app from the environment
+    os.environ['VIDEO_GAMES_DATA'] = args.path
+    uvicorn.run('api:create_app', factory=True, app_dir=os.path.dirname(os.path.abspath(__file__)),
+                host=args.host, port=args.port, workers=args.workers, access_log=False, log_level='warning')
@@ -0,0 +1,125 @@
+# import the libraries
+import argparse
+import os
+import shutil
+
+import pandas as pd
+
+from data_loader import DATA_PATH, columnar_path, content_hash, drop_incomplete_rows, is_columnar_current, read_dataset
+from dataset_schema import SALES_COLUMNS, SCHEMA, STORAGE_SCHEMA, apply_schema
+from game_entities import GameEntities, read_game_entities, write_game_entities
+from ingest import write_columnar
+from sales_cube import build_cube, patch_cube, read_cube, write_cube
+
+# a game is identified by its name, platform and year of release,
+# a row with the key of a stored game replaces it and any other row is a new game
+UPDATE_KEY = ['Name', 'Platform', 'Year_of_Release']
+
+
+def validate_rows(rows):
+    # check the rows against the schema of the dataset and return them with the storage dtypes,
+    # a ValueError tells what is wrong
+    missing = [column for column in SCHEMA if column not in rows.columns]
+    unknown = [column for column in rows.columns if column not in SCHEMA]
+    if missing or unknown:
+        raise ValueError('the rows must have the columns of the dataset, missing: {}, unknown: {}'.format(
+            ', '.join(missing) or 'none', ', '.join(unknown) or 'none'))
+    try:
+        rows = rows[list(SCHEMA)].astype(STORAGE_SCHEMA)
+    except (TypeError, ValueError) as error:
+        raise ValueError('the rows do not match the schema of the dataset: {}'.format(error)) from error
+    if rows[['Name', 'Platform']].isna().any(axis=None):
+        raise ValueError('every row needs a name and a platform to identify its game')
+    if (rows[SALES_COLUMNS] < 0).any(axis=None):
+        raise ValueError('the sales cannot be negative')
+    duplicated = rows.duplicated(UPDATE_KEY)
+    if duplicated.any():
+        raise ValueError('the rows list the same game more than once: {}'.format(
+            ', '.join(rows.loc[duplicated, 'Name'].astype('str'))))
+    return rows
+
+
+def game_keys(video_game):
+    # the key of every row, with the storage dtypes so stored and new rows compare equal
+    return pd.MultiIndex.from_frame(video_game[UPDATE_KEY].astype({column: STORAGE_SCHEMA[column] for column in UPDATE_KEY}))
+
+
+def line_ending(path):
+    # the line ending of the csv, kept when rows are written to it
+    with open(path, 'rb') as data_file:
+        return '\r\n' if data_file.readline().endswith(b'\r\n') else '\n'
+
+
+def append_csv(rows, path):
+    # copy the csv and write the rows at its end, the copy replaces the csv so a reader never sees a half written file
+    temporary_path = path + '.tmp'
+    shutil.copyfile(path, temporary_path)
+    with open(temporary_path, 'rb') as data_file:
+        data_file.seek(-1, os.SEEK_END)
+        ends_with_newline = data_file.read(1) in (b'\n', b'\r')
+    newline = line_ending(path)
+    with open(temporary_path, 'a', newline='') as data_file:
+        if not ends_with_newline:
+            data_file.write(newline)
+        rows.to_csv(data_file, header=False, index=False, lineterminator=newline)
+    os.replace(temporary_path, path)
+
+
+def write_csv(video_game, path):
+    # write the whole dataset again, with the storage dtypes so the years and counts stay integers
+    temporary_path = path + '.tmp'
+    video_game.astype(STORAGE_SCHEMA).to_csv(temporary_path, index=False, lineterminator=line_ending(path))
+    os.replace(temporary_path, path)
+
+
+def append_rows(rows, path=DATA_PATH):
+    # add new games to the dataset and replace the stored rows of the games already in it,
+    # then patch the persisted sales cube by the delta of the rows instead of aggregating everything again
+    rows = validate_rows(rows)
+    source_hash = content_hash(path)
+    columnar = not path.endswith('.parquet') and is_columnar_current(path)
+    stored = read_dataset(path)
+    stored_keys, row_keys = game_keys(stored), game_keys(rows)
+    replaced = stored_keys.isin(row_keys)
+    video_game = apply_schema(pd.concat([stored[~replaced].astype(STORAGE_SCHEMA), rows], ignore_index=True))
+
+    if path.endswith('.parquet'):
+        write_columnar(video_game, path)
+    elif replaced.any():
+        write_csv(video_game, path)
+    else:
+        append_csv(rows, path)
+    updated_hash = content_hash(path)
+    if columnar:
+        write_columnar(video_game, columnar_path(path), updated_hash)
+
+    # patch the cube and the game entities of the previous version of the dataset, or build them when there are none,
+    # both are read before the new version is stored as storing it removes the artifacts of the previous one
+    cube = read_cube(source_hash, path)
+    entities = read_game_entities(source_hash, path)
+    kept = drop_incomplete_rows(video_game)
+    added, removed = drop_incomplete_rows(apply_schema(rows)), drop_incomplete_rows(stored[replaced])
+    if cube is None:
+        cube = build_cube(kept)
+    else:
+        cube = patch_cube(cube, added, removed, kept)
+    write_cube(cube, updated_hash, path)
+    if entities is None:
+        entities = GameEntities().refresh(kept)
+    else:
+        entities.refresh(added, removed)
+    write_game_entities(entities, updated_hash, path)
+    return int((~row_keys.isin(stored_keys)).sum()), int(replaced.sum())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Add new games to the dataset and replace the rows of the games '
+                                                 'already in it, the sales cube is updated by the delta.')
+    parser.add_argument('rows', help='csv file of the rows, with the columns of the dataset')
+    parser.add_argument('--path', default=DATA_PATH, help='dataset to update, csv or parquet')
+    args = parser.parse_args()
+    try:
+        added, replaced = append_rows(pd.read_csv(args.rows), args.path)
+    except ValueError as error:
+        parser.error(str(error))
+    print('{:,} games added and {:,} rows replaced in {}'.format(added, replaced, args.path))
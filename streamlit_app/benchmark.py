@@ -0,0 +1,184 @@
+# import the libraries
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+import plotly
+import plotly.io as pio
+
+from data_loader import ANALYSIS_COLUMNS, DATA_PATH, clean_video_games
+from dataset_schema import apply_schema
+from figures import FIGURES, compact_figure
+from game_entities import GameEntities
+from generate_data import generate
+from sales_cube import DIMENSIONS, RANKING_LIMITS, aggregate_dimension, sales_values
+
+# scales of the dataset benchmarked by default, 1 is the bundled csv
+DEFAULT_SCALES = [1, 10, 100, 1000]
+# a stage slower than this ratio of the compared run is reported as a regression
+REGRESSION_RATIO = 1.1
+
+
+def run_pipeline(path, measure):
+    # run the pipeline of the analysis page headlessly, measure(stage, function, *args) runs
+    # one stage and returns its result so the next stages can use it
+    video_game = measure('read_csv', pd.read_csv, path)
+    video_game = measure('apply_schema', apply_schema, video_game)
+    video_game = measure('drop_columns', lambda frame: frame[ANALYSIS_COLUMNS], video_game)
+    video_game = measure('clean', clean_video_games, video_game)
+    sales = measure('sales_values', sales_values, video_game)
+    cube = {'totals': measure('aggregate_totals', lambda frame: frame.sum(), sales)}
+    for dimension in DIMENSIONS:
+        cube[dimension] = measure('aggregate_' + dimension, aggregate_dimension, sales, video_game[dimension],
+                                  RANKING_LIMITS.get(dimension))
+    cube['entities'] = measure('game_entities', lambda frame: GameEntities().refresh(frame), video_game)
+    figures = {name: measure('figure_' + name, lambda *args, builder=builder: compact_figure(builder(*args)),
+                             cube, lambda: video_game) for name, builder in FIGURES.items()}
+    specs = measure('serialize_figures', lambda built: {name: pio.to_json(fig, validate=False)
+                                                         for name, fig in built.items()}, figures)
+    # bytes of json sent to the browser per chart
+    return len(video_game), {name: len(spec.encode()) for name, spec in specs.items()}
+
+
+def time_stages(path, repeat):
+    # best wall time of every stage over the repeats
+    seconds = {}
+
+    def measure(stage, function, *args):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = function(*args)
+            elapsed = time.perf_counter() - start
+            seconds[stage] = min(elapsed, seconds.get(stage, elapsed))
+        return result
+
+    rows, payload_bytes = run_pipeline(path, measure)
+    return rows, seconds, payload_bytes
+
+
+def memory_stages(path):
+    # peak memory allocated by every stage, measured in a separate run as tracing slows the stages down
+    peak_bytes = {}
+
+    def measure(stage, function, *args):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        result = function(*args)
+        peak_bytes[stage] = tracemalloc.get_traced_memory()[1] - before
+        return result
+
+    tracemalloc.start()
+    try:
+        run_pipeline(path, measure)
+    finally:
+        tracemalloc.stop()
+    return peak_bytes
+
+
+def scaled_copy(source, scale, workdir, synthetic=False):
+    # write the csv with its rows repeated scale times, or with scale times as many synthetic rows
+    # drawn from its distributions, the file is streamed and reused between runs
+    if scale == 1 and not synthetic:
+        return source
+    path = os.path.join(workdir, '{}_{}x{}.csv'.format(os.path.splitext(os.path.basename(source))[0],
+                                                        'synthetic_' if synthetic else '', scale))
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source):
+        return path
+    if synthetic:
+        with open(source, 'rb') as source_file:
+            rows = sum(1 for _ in source_file) - 1
+        generate(path, rows*scale, source)
+    else:
+        with open(source, 'rb') as source_file:
+            header = source_file.readline()
+            body = source_file.read()
+        if not body.endswith(b'\n'):
+            body += b'\n'
+        with open(path + '.tmp', 'wb') as scaled_file:
+            scaled_file.write(header)
+            for _ in range(scale):
+                scaled_file.write(body)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def current_commit():
+    # commit of the benchmarked code, so results can be compared across commits
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_benchmark(source, scales, repeat, workdir, synthetic=False):
+    results = {
+        'commit': current_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'plotly': plotly.__version__,
+        'repeat': repeat,
+        'synthetic': synthetic,
+        'runs': [],
+    }
+    for scale in scales:
+        path = scaled_copy(source, scale, workdir, synthetic)
+        rows, seconds, payload_bytes = time_stages(path, repeat)
+        peak_bytes = memory_stages(path)
+        stages = [{'stage': stage, 'seconds': seconds[stage], 'peak_bytes': peak_bytes[stage]} for stage in seconds]
+        results['runs'].append({'scale': scale, 'rows': rows, 'stages': stages, 'payload_bytes': payload_bytes})
+        print('scale {:>5}: {:,} rows, {:.3f} s in total, {:,} bytes of charts'.format(
+            scale, rows, sum(seconds.values()), sum(payload_bytes.values())))
+    return results
+
+
+def stage_table(results):
+    # one row per scale and stage
+    return pd.DataFrame([{'scale': run['scale'], **stage} for run in results['runs'] for stage in run['stages']])
+
+
+def payload_table(results):
+    # bytes of json of every chart per scale, older results without them give an empty table
+    return pd.DataFrame([{'scale': run['scale'], 'chart': chart, 'payload_bytes': payload_bytes}
+                         for run in results['runs'] for chart, payload_bytes in run.get('payload_bytes', {}).items()])
+
+
+def compare(results, previous):
+    # ratio of the stage times to a previous run, above REGRESSION_RATIO is a regression
+    table = stage_table(results).merge(stage_table(previous), on=['scale', 'stage'], suffixes=('', '_previous'))
+    table['ratio'] = (table['seconds'] / table['seconds_previous']).round(2)
+    table['regression'] = table['ratio'] > REGRESSION_RATIO
+    return table[['scale', 'stage', 'seconds_previous', 'seconds', 'ratio', 'regression']]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time and measure the memory of every stage of the analysis pipeline.')
+    parser.add_argument('--source', default=DATA_PATH, help='csv file to benchmark, the bundled dataset by default')
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES,
+                        help='number of copies of the rows to benchmark, 1 is the source itself')
+    parser.add_argument('--synthetic', action='store_true',
+                        help='benchmark synthetic rows drawn from the distributions of the source instead of repeated rows')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per stage, the best time is kept')
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'video_game_benchmark'),
+                        help='directory of the scaled copies of the source')
+    parser.add_argument('--output', default=None, help='json file of the results, benchmark-<commit>.json by default')
+    parser.add_argument('--compare', default=None, help='json file of a previous run to compare the results with')
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    results = run_benchmark(args.source, args.scales, args.repeat, args.workdir, args.synthetic)
+    output = args.output or 'benchmark-{}.json'.format(results['commit'])
+    with open(output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+    print(stage_table(results).to_string(index=False))
+    print(payload_table(results).to_string(index=False))
+    print('results written to {}'.format(output))
+    if args.compare:
+        with open(args.compare) as previous_file:
+            print(compare(results, json.load(previous_file)).to_string(index=False))
@@ -0,0 +1,113 @@
+# import the libraries
+import hashlib
+import os
+
+import pandas as pd
+import streamlit as st
+
+from dataset_schema import SCHEMA, apply_schema
+from instrumentation import stage
+
+# path of the dataset, resolved from this file so the app works from any working directory
+# VIDEO_GAMES_DATA points the app at another csv or parquet file with the same columns, like a synthetic one
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Data')
+DATA_PATH = os.environ.get('VIDEO_GAMES_DATA', os.path.join(DATA_DIR, 'Video_Games.csv'))
+
+# columns used by the analysis, the review columns (scores, developer, rating) are dropped when cleaning
+ANALYSIS_COLUMNS = ['Name', 'Platform', 'Year_of_Release', 'Genre', 'Publisher',
+                    'NA_Sales', 'EU_Sales', 'JP_Sales', 'Other_Sales', 'Global_Sales']
+
+# the rules of drop_incomplete_rows and clean_video_games, recorded with every artifact derived from the dataset
+CLEANING = {
+    'dropped_columns': [column for column in SCHEMA if column not in ANALYSIS_COLUMNS],
+    'required_columns': ['Name', 'Publisher'],
+    'year_fill': 'median of the known years, rounded',
+}
+
+# content hashes already computed, keyed on (path, mtime, size)
+_hash_memo = {}
+
+
+def content_hash(path=DATA_PATH):
+    # hash of the file content, memoized per file version so a rerun only pays for a stat() call
+    stat = os.stat(path)
+    memo_key = (path, stat.st_mtime_ns, stat.st_size)
+    if memo_key not in _hash_memo:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as data_file:
+            for block in iter(lambda: data_file.read(1 << 20), b''):
+                digest.update(block)
+        _hash_memo[memo_key] = digest.hexdigest()
+    return _hash_memo[memo_key]
+
+
+def file_fingerprint(path=DATA_PATH):
+    # the fingerprint combines the modification time and a hash of the content,
+    # so every cache keyed on it is invalidated as soon as the file changes
+    return '{}-{}'.format(os.stat(path).st_mtime_ns, content_hash(path))
+
+
+def columnar_path(path=DATA_PATH):
+    # the columnar copy written by ingest.py lives next to the csv
+    return os.path.splitext(path)[0] + '.parquet'
+
+
+def is_columnar_current(path=DATA_PATH):
+    # the columnar copy is only used when it was ingested from this version of the csv
+    try:
+        import pyarrow.parquet as pq
+        metadata = pq.read_schema(columnar_path(path)).metadata or {}
+    except (ImportError, OSError):
+        return False
+    return metadata.get(b'source_hash', b'').decode() == content_hash(path)
+
+
+def read_dataset(path=DATA_PATH, columns=None):
+    # read only the requested columns, from the columnar copy when it is up to date
+    if path.endswith('.parquet'):
+        return apply_schema(pd.read_parquet(path, columns=columns))
+    if is_columnar_current(path):
+        return apply_schema(pd.read_parquet(columnar_path(path), columns=columns))
+    return apply_schema(pd.read_csv(path, usecols=columns))
+
+
+def drop_incomplete_rows(video_game):
+    # in this analysis we will only be looking for video games sales
+    # keep the first ten columns, we won't use the review columns for this analysis
+    video_game = video_game[ANALYSIS_COLUMNS]
+    # we will drop these two rows as is will not have a big impact on the analysis
+    video_game = video_game.dropna(subset=['Name'])
+    # drop the rows as it won't have a big impact on the dataframe
+    return video_game.dropna(subset=['Publisher'])
+
+
+def clean_video_games(video_game):
+    video_game = drop_incomplete_rows(video_game)
+    # replace missing years with the median value, rounded as the years are stored as integers
+    video_game['Year_of_Release'] = video_game['Year_of_Release'].fillna(round(video_game['Year_of_Release'].median()))
+    return video_game
+
+
+# the parsed frame is kept once per process and shared by every session,
+# the fingerprint is part of the key so a new version of the file is reloaded
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _read_video_games(path, fingerprint, clean):
+    # the registry imports this module
+    from registry import load_artifact
+
+    def build():
+        with stage('read_dataset'):
+            video_game = read_dataset(path, columns=ANALYSIS_COLUMNS if clean else None)
+        if not clean:
+            return video_game
+        with stage('clean'):
+            return clean_video_games(video_game)
+
+    # both frames are stored with the other artifacts as memory mapped arrow files, so a restart does not parse
+    # or clean the dataset again and every server process of the same dataset shares one copy of the rows
+    return load_artifact('cleaned' if clean else 'dataset', build, path)
+
+
+def load_video_games(clean=True, path=DATA_PATH):
+    # the returned frame is shared between sessions, pages must not modify it in place
+    return _read_video_games(path, file_fingerprint(path), clean)
@@ -0,0 +1,64 @@
+# import the libraries
+import pandas as pd
+
+# declared dtypes of the video game dataset, used by every loader instead of letting pandas infer them
+# - the repeated labels are categories, each distinct value is stored once and the rows keep a small code,
+#   this also interns the names as the same title is listed once per platform
+# - the years and the review counts are nullable small integers
+# - the sales are float32, they only have 2 decimals
+SALES_COLUMNS = ['NA_Sales', 'EU_Sales', 'JP_Sales', 'Other_Sales', 'Global_Sales']
+SCHEMA = {
+    'Name': 'category',
+    'Platform': 'category',
+    'Year_of_Release': 'Int16',
+    'Genre': 'category',
+    'Publisher': 'category',
+    **{column: 'float32' for column in SALES_COLUMNS},
+    'Critic_Score': 'Int8',
+    'Critic_Count': 'Int16',
+    'User_Score': 'category',
+    'User_Count': 'Int32',
+    'Developer': 'category',
+    'Rating': 'category',
+}
+
+# dtypes of the files written chunk by chunk, the categories of a chunk are not known in advance so
+# the labels are stored as strings (dictionary encoded by parquet) and become categories when loaded
+STORAGE_SCHEMA = {column: 'str' if dtype == 'category' else dtype for column, dtype in SCHEMA.items()}
+
+
+def schema_for(columns=None):
+    # dtypes of the requested columns, of every column when columns is None
+    return {column: dtype for column, dtype in SCHEMA.items() if columns is None or column in columns}
+
+
+def apply_schema(video_game):
+    # convert a frame read without dtypes, the columns missing from the frame are ignored
+    return video_game.astype(schema_for(video_game.columns))
+
+
+def memory_footprint(video_game):
+    # bytes used by every column, including the strings held by the object columns
+    return video_game.memory_usage(deep=True, index=False)
+
+
+def memory_report(path):
+    # compare the memory used by the dataset with the inferred dtypes and with the declared schema
+    before = memory_footprint(pd.read_csv(path))
+    after = memory_footprint(apply_schema(pd.read_csv(path)))
+    report = pd.DataFrame({'inferred_bytes': before, 'schema_bytes': after})
+    report.loc['Total'] = report.sum()
+    report['ratio'] = (report['schema_bytes'] / report['inferred_bytes']).round(3)
+    return report
+
+
+if __name__ == '__main__':
+    # print the before/after memory footprint of the bundled dataset
+    import argparse
+
+    from data_loader import DATA_PATH
+
+    parser = argparse.ArgumentParser(description='Report the memory used by the dataset with and without the schema.')
+    parser.add_argument('--source', default=DATA_PATH, help='csv file to measure')
+    args = parser.parse_args()
+    print(memory_report(args.source).to_string())
@@ -0,0 +1,88 @@
+# import the libraries
+import math
+
+import numpy as np
+import streamlit as st
+
+# number of rows sent to the browser per page
+PAGE_SIZE = 100
+# distinct values returned by a search, and completions offered for what is typed
+SEARCH_RESULTS = 50
+COMPLETIONS = 5
+
+
+def use_completion(key):
+    # the picked completion replaces the query
+    st.session_state[key] = st.session_state[key + '_completion']
+    st.session_state[key + '_completion'] = None
+
+
+def ranked_rows(values, codes):
+    # positions of the rows holding one of the category codes, the rows of the first code first
+    rank = np.full(len(values.cat.categories) + 1, len(codes))
+    rank[codes] = np.arange(len(codes))
+    # missing values have the code -1, the rank of no match
+    row_ranks = rank[values.cat.codes.to_numpy()]
+    rows = np.flatnonzero(row_ranks < len(codes))
+    return rows[np.argsort(row_ranks[rows], kind='stable')]
+
+
+def search_rows(video_game, search_index, key='search'):
+    # fuzzy search of a game or a publisher: the rows of the values most similar to the query, the best match
+    # first, with the completions of the query as suggestions, None when nothing is searched
+    left, right = st.columns((4, 1))
+    column = right.selectbox('Search in', list(search_index), key=key + '_column')
+    query = left.text_input('Search', key=key, placeholder='pokemon, mario kart, ubisoft...')
+    if not query:
+        return None
+    index = search_index[column]
+    completions = index.complete(query, COMPLETIONS)
+    if completions:
+        st.pills('Suggestions', completions, key=key + '_completion', on_change=use_completion, args=(key,))
+    codes, _ = index.search(query, SEARCH_RESULTS)
+    return ranked_rows(video_game[column], codes)
+
+
+def filter_widgets(index, columns, key):
+    # let the viewer pick the columns to filter on and the filter of each column,
+    # the kind of filter of each column is decided by its index
+    # filters[column] is ('values', list), ('range', (low, high)) or ('pattern', text)
+    filters = {}
+    to_filter_columns = st.multiselect('Filter dataframe on', columns, key=key + '_columns')
+    for column in to_filter_columns:
+        left, right = st.columns((1, 20))
+        left.write('↳')
+        kind = index.kinds[column]
+        if kind == 'values':
+            selected = right.multiselect('Values for {}'.format(column), index.categories[column],
+                                         key='{}_{}'.format(key, column))
+            if selected:
+                filters[column] = ('values', selected)
+        elif kind == 'range':
+            low, high = index.bounds(column)
+            selected = right.slider('Values for {}'.format(column), low, high, (low, high),
+                                    step=(high - low) / 100 or 1.0, key='{}_{}'.format(key, column))
+            if selected != (low, high):
+                filters[column] = ('range', selected)
+        else:
+            pattern = right.text_input('Pattern in {}'.format(column), key='{}_{}'.format(key, column))
+            if pattern:
+                filters[column] = ('pattern', pattern)
+    return filters
+
+
+def paginated_explorer(video_game, index, rows=None, page_size=PAGE_SIZE, key='explorer'):
+    # filter on the server with the prebuilt index and return only the rows of the selected page,
+    # among the given rows and in their order when there are some
+    filters = filter_widgets(index, video_game.columns, key)
+    positions = index.positions(filters)
+    if rows is not None:
+        positions = rows[np.isin(rows, positions, assume_unique=True)]
+    page_count = max(1, math.ceil(len(positions) / page_size))
+    # go back to a valid page when the filters leave fewer pages than the one selected
+    page_key = key + '_page'
+    if st.session_state.get(page_key, 1) > page_count:
+        st.session_state[page_key] = page_count
+    page = st.number_input('Page', min_value=1, max_value=page_count, step=1, key=page_key)
+    st.caption('{:,} matching rows, page {} of {:,}'.format(len(positions), page, page_count))
+    return video_game.iloc[positions[(page - 1)*page_size:page*page_size]]
@@ -0,0 +1,180 @@
+# import the libraries
+import argparse
+import html
+import importlib.util
+import os
+import re
+import shutil
+from unittest import mock
+
+import plotly
+import plotly.io as pio
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from data_loader import DATA_PATH, content_hash
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+PAGE_PATH = os.path.join(APP_DIR, 'Analysis.py')
+# plotly.js is shared by every chart and every version of the report, its name changes with the plotly version
+# so a static file server can let browsers cache it for good
+PLOTLY_JS = 'plotly-{}.min.js'.format(plotly.__version__)
+# seconds allowed for one run of the page
+RUN_TIMEOUT = 600
+
+PAGE_TEMPLATE = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<meta name="dataset-version" content="{version}">
+<title>Video Game Sales Analysis</title>
+<style>
+body {{ font-family: sans-serif; max-width: 1000px; margin: 0 auto; padding: 1rem 2rem; line-height: 1.6; color: #31333f; }}
+img {{ max-width: 100%; }}
+details {{ border: 1px solid #e6e6e6; border-radius: 0.5rem; padding: 0.5rem 1rem; margin: 1rem 0; }}
+summary {{ cursor: pointer; font-weight: bold; }}
+ul {{ margin: 0.25rem 0; }}
+.chart {{ min-height: 450px; }}
+</style>
+<script src="{plotly_js}"></script>
+</head>
+<body>
+{body}
+<script>
+// draw every chart from its json, the same figure the app sends to the browser
+document.querySelectorAll('script[data-chart]').forEach(function (data) {{
+  var figure = JSON.parse(data.textContent);
+  Plotly.newPlot(document.getElementById(data.dataset.chart), figure.data, figure.layout, {{responsive: true}});
+}});
+</script>
+</body>
+</html>
+'''
+
+
+def inline_markdown(text):
+    # bold and links, the only inline markdown of the page, the text is escaped first
+    text = html.escape(text, quote=False)
+    text = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', text)
+    return re.sub(r'\[([^\]]+)\]\(([^)]+)\)', lambda match: '<a href="{}">{}</a>'.format(
+        html.escape(match.group(2)), match.group(1)), text)
+
+
+def markdown_html(text):
+    # paragraphs, bullet lists and separators, the markdown written by the page
+    blocks = []
+    for block in re.split(r'\n\s*\n', text.strip()):
+        lines = [line.strip() for line in block.splitlines()]
+        if all(re.fullmatch(r'-{3,}', line) for line in lines):
+            blocks.append('<hr>')
+        elif all(line.startswith('- ') for line in lines):
+            blocks.append('<ul>\n{}\n</ul>'.format('\n'.join(
+                '<li>{}</li>'.format(inline_markdown(line[2:])) for line in lines)))
+        else:
+            blocks.append('<p>{}</p>'.format(inline_markdown(' '.join(lines))))
+    return '\n'.join(blocks)
+
+
+def run_page(images):
+    # run the page headlessly with every section open, the path of every st.image is recorded
+    # in images as the test runner keeps the image bytes to itself
+    streamlit_image = st.image
+
+    def image(source, *args, **kwargs):
+        images.append(source)
+        return streamlit_image(source, *args, **kwargs)
+
+    page = AppTest.from_file(PAGE_PATH, default_timeout=RUN_TIMEOUT)
+    with mock.patch.object(st, 'image', image):
+        page.run()
+        for section in page.expander:
+            page.session_state[section.key] = True
+        del images[:]
+        page.run()
+    if page.exception:
+        raise RuntimeError('the page failed: {}'.format(page.exception[0].value))
+    return page
+
+
+def render(node, assets, charts):
+    # html of the elements of the page in their order, the charts are collected with their json
+    parts = []
+    for element in node.children.values():
+        kind = element.type
+        if kind == 'markdown':
+            parts.append(element.value if element.proto.allow_html else markdown_html(element.value))
+        elif kind == 'header':
+            parts.append('<h2>{}</h2>'.format(html.escape(element.value)))
+        elif kind == 'image':
+            parts.append('<img src="{}" alt="">'.format(html.escape(assets.pop(0))))
+        elif kind == 'expander':
+            parts.append('<details open>\n<summary>{}</summary>\n{}\n</details>'.format(
+                html.escape(element.label), render(element, assets, charts)))
+        elif kind == 'plotly_chart':
+            chart = 'chart-{}'.format(len(charts))
+            charts.append((chart, element.proto.spec))
+            # a closing tag in the json would end the script element
+            parts.append('<div class="chart" id="{0}"></div>\n<script type="application/json" data-chart="{0}">{1}'
+                         '</script>'.format(chart, element.proto.spec.replace('</', '<\\/')))
+        else:
+            raise ValueError('the export does not know how to render a {} element'.format(kind))
+    # the page writes some lists one item at a time
+    return '\n'.join(parts).replace('</ul>\n<ul>\n', '')
+
+
+def export_report(output, png=False, force=False):
+    # write the analysis as a static html page with the figures as json, a shared plotly.js and the images,
+    # the report is only rebuilt for a new version of the dataset the page reads, VIDEO_GAMES_DATA like the app
+    version = content_hash(DATA_PATH)
+    version_path = os.path.join(output, 'VERSION')
+    if not force and os.path.exists(version_path):
+        with open(version_path) as version_file:
+            if version_file.read().strip() == version:
+                return False
+
+    images = []
+    page = run_page(images)
+    assets = ['img/{}'.format(os.path.basename(image)) for image in images]
+    charts = []
+    body = render(page.main, list(assets), charts)
+
+    os.makedirs(output, exist_ok=True)
+    # files of the new version are written next to the served ones and renamed over them
+    os.makedirs(os.path.join(output, 'img'), exist_ok=True)
+    for image, asset in zip(images, assets):
+        shutil.copyfile(image, os.path.join(output, asset + '.tmp'))
+        os.replace(os.path.join(output, asset + '.tmp'), os.path.join(output, asset))
+    plotly_path = os.path.join(output, PLOTLY_JS)
+    if not os.path.exists(plotly_path):
+        with open(plotly_path + '.tmp', 'w', encoding='utf-8') as plotly_file:
+            plotly_file.write(plotly.offline.get_plotlyjs())
+        os.replace(plotly_path + '.tmp', plotly_path)
+    if png:
+        os.makedirs(os.path.join(output, 'png'), exist_ok=True)
+        for chart, spec in charts:
+            pio.write_image(pio.from_json(spec), os.path.join(output, 'png', chart + '.png'))
+    page_path = os.path.join(output, 'index.html')
+    with open(page_path + '.tmp', 'w', encoding='utf-8') as page_file:
+        page_file.write(PAGE_TEMPLATE.format(version=version, plotly_js=PLOTLY_JS, body=body))
+    os.replace(page_path + '.tmp', page_path)
+    # the version is written last, an interrupted export is done again on the next run
+    with open(version_path + '.tmp', 'w') as version_file:
+        version_file.write(version + '\n')
+    os.replace(version_path + '.tmp', version_path)
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the analysis page as a static html report, '
+                                                 'once per version of the dataset.')
+    parser.add_argument('output', help='directory of the report, served by any static file server')
+    parser.add_argument('--png', action='store_true', help='also write a png snapshot of every chart, needs kaleido')
+    parser.add_argument('--force', action='store_true', help='export even if the report is of the current version')
+    args = parser.parse_args()
+    if args.png and importlib.util.find_spec('kaleido') is None:
+        parser.error('--png needs the kaleido package, pip install kaleido')
+    if export_report(args.output, args.png, args.force):
+        print('report written to {}'.format(os.path.join(args.output, 'index.html')))
+    else:
+        print('the report in {} is already of the current version of the dataset'.format(args.output))
@@ -0,0 +1,359 @@
+# import the libraries
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.subplots as sp
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from data_loader import DATA_PATH, content_hash, file_fingerprint, load_video_games
+from game_entities import load_game_entities
+from instrumentation import add_stages, is_enabled, plotly_chart, stage, thread_stages
+from registry import artifact_path, load_artifact, write_artifact
+from sales_cube import load_cube, ranking, region_table
+from top_n import top_rows
+
+# titles and positions of the four regional plots of the subplot grids
+REGION_TITLES = ('NA Sales', 'EU Sales', 'JP Sales', 'Other Sales')
+GRID_REGIONS = [('NA_Sales', 1, 1), ('EU_Sales', 1, 2), ('JP_Sales', 2, 1), ('Other_Sales', 2, 2)]
+# number of figures built at the same time, one per core by default
+FIGURE_WORKERS_VARIABLE = 'VIDEO_GAMES_FIGURE_WORKERS'
+
+# the threads getting the figures of the pages, shared by every session
+_pool = None
+_pool_lock = threading.Lock()
+# the figures shown by the run of the current thread and not drawn yet
+_pending = threading.local()
+# the fingerprint of the dataset every figure was last got for by this process, those are in the cache and read
+# on the thread of the script instead of waiting in the pool behind the figures other sessions are building
+_resolved = {}
+
+
+class LazyCube(dict):
+    # the aggregates of the sales cube with inputs read on first use: a figure of the cube
+    # does not load the game entities, entities=load_game_entities reads them for the figures of the games
+    def __init__(self, cube, **loaders):
+        super().__init__(cube)
+        self.loaders = loaders
+
+    def __missing__(self, key):
+        if key not in self.loaders:
+            raise KeyError(key)
+        self[key] = self.loaders[key]()
+        return self[key]
+
+
+def region_totals(cube):
+    # total sales per region and global sales, multiplied by 1000000 as the columns are in millions
+    return [cube['totals'][region]*1000000 for region in ['NA_Sales', 'EU_Sales', 'JP_Sales', 'Other_Sales', 'Global_Sales']]
+
+
+def region_grid(cube, dimension, n=None):
+    # initialize a subplot with a bar plot of the top values of the dimension for each region
+    fig = sp.make_subplots(rows=2, cols=2, subplot_titles=REGION_TITLES)
+    for region, row, col in GRID_REGIONS:
+        fig.add_trace(px.bar(ranking(cube, dimension, region, n), x=dimension, y=region, color=region).data[0],
+                      row=row, col=col)
+    return fig
+
+
+def sales_by_region(cube, video_game):
+    # create a bar chart to show total sales by region
+    totals = region_totals(cube)
+    return px.bar(x=['NA Sales', 'EU Sales', 'JP Sales', 'Other Sales', 'Global Sales'],
+                  y=totals,
+                  labels={'x': 'Region', 'y': 'Sales'},
+                  title='Sales by Region',
+                  color=totals)
+
+
+def region_share(cube, video_game):
+    # create a pie chart to show the share of every region in %
+    fig = px.pie(values=region_totals(cube)[:4],
+                 names=['NA Sales', 'EU Sales', 'JP Sales', 'Other Sales'],
+                 title='Share of Sales by Region')
+    # add a title to the legend
+    fig.update_layout(legend_title='Market')
+    return fig
+
+
+def sales_by_year(cube, video_game):
+    # create lineplot of sales by year and region
+    fig = px.line(region_table(cube, 'Year_of_Release'), x='Year_of_Release',
+                  y=['NA_Sales', 'EU_Sales', 'JP_Sales', 'Other_Sales', 'Global_Sales'],
+                  title='Sales by Year')
+    # update the axis titles and legend
+    fig.update_layout(xaxis_title='Year of Release',
+                      yaxis_title='Copies in millions',
+                      legend_title='Market')
+    return fig
+
+
+def platform_sales(cube, video_game):
+    # create bar plot for global sales per platform
+    fig = px.bar(ranking(cube, 'Platform', 'Global_Sales'), x='Platform', y='Global_Sales',
+                 title='Total Sales by Platform',
+                 color='Global_Sales')
+    # update axis title
+    fig.update_layout(yaxis_title='Copies in millions')
+    fig.update_xaxes(tickangle=45)
+    return fig
+
+
+def platform_sales_by_region(cube, video_game):
+    fig = region_grid(cube, 'Platform')
+    # update the title and the dimensions
+    fig.update_layout(height=600, width=950,
+                      title_text="Video Game Sales by Platform",
+                      yaxis_title='Copies in millions')
+    # update angle of x axis
+    fig.update_xaxes(tickangle=45)
+    return fig
+
+
+def top_publishers(cube, video_game):
+    # create bar plot of top 20 publishers by global sales
+    fig = px.bar(ranking(cube, 'Publisher', 'Global_Sales', 20), x='Publisher', y='Global_Sales',
+                 title='Top 20 publishers', color='Global_Sales')
+    # update y axis title
+    fig.update_layout(yaxis_title='Copies in millions')
+    fig.update_xaxes(tickangle=45)
+    return fig
+
+
+def top_publishers_by_region(cube, video_game):
+    fig = region_grid(cube, 'Publisher', 20)
+    # update the dimensions and title
+    fig.update_layout(height=1200, width=950, title_text="Top 20 publishers by Region",
+                      yaxis_title='Copies in millions')
+    fig.update_xaxes(tickangle=45)
+    return fig
+
+
+def genre_sales(cube, video_game):
+    # create bar plot of global sales by genre
+    fig = px.bar(ranking(cube, 'Genre', 'Global_Sales'), x='Genre', y='Global_Sales',
+                 title='Global Sales by Genre', color='Global_Sales')
+    # update y axis title
+    fig.update_yaxes(title='Copies in millions')
+    return fig
+
+
+def genre_sales_by_region(cube, video_game):
+    fig = region_grid(cube, 'Genre')
+    # update dimensions and title
+    fig.update_layout(height=900, width=950, title_text="Sales by Genre per Region",
+                      yaxis_title='Copies in millions')
+    fig.update_xaxes(tickangle=45)
+    return fig
+
+
+def genre_by_platform(cube, video_game):
+    # the sunburst only needs the sales of every platform and genre, summed before plotting instead of
+    # handing every game to px.sunburst, the pairs keep the order of their first game like px does
+    leaves = video_game().groupby(['Platform', 'Genre'], observed=True, sort=False)['Global_Sales'].sum().reset_index()
+    # create a sunburst of genres per platform
+    fig = px.sunburst(leaves, path=['Platform', 'Genre'],
+                      values='Global_Sales', title='Genre distribution by platform')
+    # the id of a sector already names its platform and genre, the hover does not repeat the label and parent
+    fig.update_traces(hovertemplate='%{id}<br>Global_Sales=%{value}<extra></extra>')
+    return fig
+
+
+def top_games(cube, video_game):
+    # top 20 games sorted by global sales
+    games = top_rows(video_game(), 'Global_Sales', 20)
+    # create bar plot of sales per game
+    fig = px.bar(games, x='Name', y='Global_Sales',
+                 title='Top 20 Games by Global Sales', color='Global_Sales')
+    # update y axis title
+    fig.update_layout(yaxis_title='Copies in millions',
+                      xaxis_title='Game')
+    fig.update_xaxes(tickangle=45)
+    return fig
+
+
+def top_games_by_genre(cube, video_game):
+    # create a bar plot of sales top 20 games by genre
+    games = top_rows(video_game(), 'Global_Sales', 20)
+    fig = px.bar(games, x='Name', y='Global_Sales',
+                 title='Top 20 Games by Global Sales by Genre', color='Genre')
+    # update axis titles
+    fig.update_layout(xaxis_title='Game',
+                      yaxis_title='Copies in millions')
+    fig.update_xaxes(tickangle=45)
+    return fig
+
+
+def top_games_by_region(cube, video_game):
+    # the games are the entities of the cube, a game sold on several platforms or under several names is one bar
+    fig = sp.make_subplots(rows=2, cols=2, subplot_titles=REGION_TITLES)
+    for region, row, col in GRID_REGIONS:
+        fig.add_trace(px.bar(cube['entities'].top(region, 20), x='Name', y=region, color=region,
+                             hover_data=['Platforms']).data[0], row=row, col=col)
+    # update dimensions and titles
+    fig.update_layout(height=1200, width=1000, title_text="Top 20 Games by Region",
+                      yaxis_title='Copies in millions')
+    fig.update_xaxes(tickangle=45)
+    return fig
+
+
+# every figure of the analysis page, in the order of the page, each built from the cube and a callable
+# returning the cleaned rows, the figures of the cube alone don't read the rows
+FIGURES = {
+    'sales_by_region': sales_by_region,
+    'region_share': region_share,
+    'sales_by_year': sales_by_year,
+    'platform_sales': platform_sales,
+    'platform_sales_by_region': platform_sales_by_region,
+    'top_publishers': top_publishers,
+    'top_publishers_by_region': top_publishers_by_region,
+    'genre_sales': genre_sales,
+    'genre_sales_by_region': genre_sales_by_region,
+    'genre_by_platform': genre_by_platform,
+    'top_games': top_games,
+    'top_games_by_genre': top_games_by_genre,
+    'top_games_by_region': top_games_by_region,
+}
+
+
+def compact_figure(fig):
+    # the template carries the defaults of a dozen trace types and is sent with every chart,
+    # only the defaults of the trace types of the figure are kept, the chart looks the same
+    used = {trace.type for trace in fig.data}
+    template = fig.layout.template
+    fig.layout.template = go.layout.Template(layout=template.layout,
+                                             data={trace_type: template.data[trace_type] for trace_type in used})
+    return fig
+
+
+def build_figure(name, path=DATA_PATH):
+    # build one figure of the analysis page from the cached sales cube, the game entities and the cleaned
+    # dataset are only read by the figures using them, a cold start does not load them for the first chart
+    cube = LazyCube(load_cube(path), entities=lambda: load_game_entities(path))
+    with stage('figure/' + name):
+        return compact_figure(FIGURES[name](cube, lambda: load_video_games(path=path)))
+
+
+# the figures are built once per version of the dataset and shared by every session,
+# the oldest entries are evicted past max_entries so old versions don't pile up
+@st.cache_resource(show_spinner=False, max_entries=2*len(FIGURES))
+def _cached_figure(name, path, fingerprint):
+    # a restart reads the figures of the current version from the registry instead of building them again
+    return load_artifact('figure.' + name, lambda: build_figure(name, path), path)
+
+
+def figure_workers():
+    # one per core unless the environment sets another number, a value that is not a number is ignored
+    try:
+        workers = int(os.environ.get(FIGURE_WORKERS_VARIABLE) or 0)
+    except ValueError:
+        workers = 0
+    return max(1, workers or os.cpu_count() or 1)
+
+
+def figure_pool():
+    # created on first use and kept for the life of the server
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(figure_workers(), thread_name_prefix='figure')
+        return _pool
+
+
+def build_figures(names, path=DATA_PATH, workers=None):
+    # build the figures missing from the registry in a pool of processes and store them, plotly builds them in
+    # python under the gil so only processes build them on several cores at once, the names built are returned
+    # the workers are forked with the cube and the frames already loaded, this process stores what they return
+    source_hash = content_hash(path)
+    missing = [name for name in names if not os.path.exists(artifact_path('figure.' + name, source_hash, path))]
+    workers = min(workers or figure_workers(), len(missing))
+    if workers < 2:
+        # get_figure() builds them one by one
+        return []
+    load_cube(path), load_game_entities(path), load_video_games(path=path)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for name, fig in zip(missing, pool.map(build_figure, missing, [path] * len(missing))):
+            write_artifact('figure.' + name, fig, source_hash, path)
+    return missing
+
+
+def _resolve_figure(name, path, context, measured):
+    # get_figure in a thread of the pool, with the context of the session like on the thread of the script,
+    # and the stages it measured for the run
+    thread = threading.current_thread()
+    add_script_run_ctx(thread, context)
+    try:
+        with thread_stages(measured) as stages:
+            return get_figure(name, path), stages
+    finally:
+        add_script_run_ctx(thread, None)
+
+
+def _submit_figure(name, path):
+    return figure_pool().submit(_resolve_figure, name, path, get_script_run_ctx(), is_enabled())
+
+
+def get_figures(names, path=DATA_PATH):
+    # the figures of the names resolved in the pool, yielded as (name, figure) in the order they are ready
+    futures = {_submit_figure(name, path): name for name in names}
+    for future in as_completed(futures):
+        yield futures[future], future.result()[0]
+
+
+def get_figure(name, path=DATA_PATH):
+    # the returned figure is shared between sessions, pages must not modify it
+    fingerprint = file_fingerprint(path)
+    fig = _cached_figure(name, path, fingerprint)
+    _resolved[name, path] = fingerprint
+    return fig
+
+
+def _resolved_figure(name, path):
+    # a future already done with the figure when it is in the cache, None when it has to be read or built
+    if _resolved.get((name, path)) != file_fingerprint(path):
+        return None
+    future = Future()
+    future.set_result((get_figure(name, path), None))
+    return future
+
+
+def start_figures():
+    # called at the top of the analysis page, a run stopped by a rerun or an exception leaves the places of its
+    # figures on its thread, and without runner.fastReruns streamlit runs the rerun of a session on the same thread
+    _pending.figures = []
+
+
+def show_figure(name, path=DATA_PATH):
+    # keep the place of a figure of the analysis page and start getting it in the pool, the page goes on with its
+    # text while the figures are built, each is drawn in its place by the first show_figure() or draw_figures()
+    # called once it is ready, a figure already in the cache is ready at once
+    if getattr(_pending, 'figures', None) is None:
+        start_figures()
+    draw_figures(wait=False)
+    future = _resolved_figure(name, path) or _submit_figure(name, path)
+    _pending.figures.append((st.empty(), future, name))
+
+
+def draw_figures(wait=True):
+    # draw the figures shown by the run as soon as each is ready, whatever their order on the page, or only
+    # those already ready without waiting, measured with the size of their json when the run is instrumented
+    pending = getattr(_pending, 'figures', None) or []
+    places = {future: (placeholder, name) for placeholder, future, name in pending}
+    _pending.figures = [] if wait else [figure for figure in pending if not figure[1].done()]
+    ready = as_completed(places) if wait else [future for future in places if future.done()]
+    for future in ready:
+        placeholder, name = places[future]
+        fig, stages = future.result()
+        add_stages(stages)
+        with placeholder:
+            plotly_chart(fig, name)
+
+
+def clear_figure_cache():
+    # drop every cached figure, they are rebuilt on the next request
+    _cached_figure.clear()
+    _resolved.clear()
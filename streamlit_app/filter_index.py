@@ -0,0 +1,137 @@
+# import the libraries
+import numpy as np
+import pandas as pd
+import streamlit as st
+from pandas.api.types import is_numeric_dtype
+
+from data_loader import DATA_PATH, file_fingerprint, load_video_games
+from instrumentation import stage
+from registry import load_artifact
+
+# categorical columns with more distinct values than this are filtered with a text pattern instead of a list
+MAX_LISTED_VALUES = 100
+
+
+def trigrams(text):
+    # the overlapping 3 letter pieces of a text
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class FilterIndex:
+    # indexes built once per version of the dataset so a combination of filters is resolved
+    # by intersecting row positions instead of scanning every column of the frame:
+    # - categorical columns: inverted index, the rows of each category stored contiguously
+    # - numeric columns: the row positions sorted by value, a range is two binary searches
+    # - text columns with many values: a trigram index over the distinct values for substring search
+
+    def __init__(self, video_game):
+        self.row_count = len(video_game)
+        self.kinds = {}
+        self.categories = {}
+        self.inverted = {}
+        self.sorted_values = {}
+        self.trigram_index = {}
+        for column in video_game.columns:
+            values = video_game[column]
+            if not isinstance(values.dtype, pd.CategoricalDtype) and is_numeric_dtype(values.dtype):
+                self._index_numbers(column, values)
+            else:
+                if not isinstance(values.dtype, pd.CategoricalDtype):
+                    values = values.astype('category')
+                self._index_categories(column, values)
+
+    def _index_categories(self, column, values):
+        # the rows sorted by category code, offsets[code] is where the rows of the category start
+        codes = values.cat.codes.to_numpy()
+        order = np.argsort(codes, kind='stable')
+        counts = np.bincount(codes + 1, minlength=len(values.cat.categories) + 1)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.categories[column] = values.cat.categories
+        self.inverted[column] = (order, offsets)
+        if len(values.cat.categories) <= MAX_LISTED_VALUES:
+            self.kinds[column] = 'values'
+            return
+        self.kinds[column] = 'pattern'
+        # map every trigram of the lowercase distinct values to the codes containing it
+        lowered = values.cat.categories.astype('str').str.lower()
+        grams = {}
+        for code, text in enumerate(lowered):
+            for gram in trigrams(text):
+                grams.setdefault(gram, []).append(code)
+        self.trigram_index[column] = (lowered, {gram: np.array(found) for gram, found in grams.items()})
+
+    def _index_numbers(self, column, values):
+        # the row positions of the known values sorted by value, missing values never match a range
+        numbers = values.to_numpy(dtype='float64', na_value=np.nan)
+        known = np.flatnonzero(~np.isnan(numbers))
+        order = known[np.argsort(numbers[known], kind='stable')]
+        self.kinds[column] = 'range'
+        self.sorted_values[column] = (numbers[order], order)
+
+    def bounds(self, column):
+        # smallest and largest value of a numeric column
+        values, _ = self.sorted_values[column]
+        if len(values) == 0:
+            return 0.0, 0.0
+        return float(values[0]), float(values[-1])
+
+    def _rows_of_codes(self, column, codes):
+        # sorted row positions of the categories with the given codes
+        order, offsets = self.inverted[column]
+        slices = [order[offsets[code + 1]:offsets[code + 2]] for code in codes]
+        if not slices:
+            return np.empty(0, dtype=order.dtype)
+        return np.sort(np.concatenate(slices))
+
+    def _matching_codes(self, column, pattern):
+        # codes of the distinct values containing the pattern, case insensitive
+        lowered, grams = self.trigram_index[column]
+        pattern = pattern.lower()
+        candidates = None
+        for gram in trigrams(pattern):
+            found = grams.get(gram)
+            if found is None:
+                return []
+            candidates = found if candidates is None else np.intersect1d(candidates, found, assume_unique=True)
+        if candidates is None:
+            # patterns shorter than 3 letters are checked against every distinct value
+            candidates = range(len(lowered))
+        return [code for code in candidates if pattern in lowered[code]]
+
+    def rows(self, column, kind, value):
+        # sorted row positions matching one filter
+        if kind == 'values':
+            codes = self.categories[column].get_indexer(value)
+            return self._rows_of_codes(column, codes[codes >= 0])
+        if kind == 'range':
+            values, order = self.sorted_values[column]
+            start, stop = np.searchsorted(values, value[0], 'left'), np.searchsorted(values, value[1], 'right')
+            return np.sort(order[start:stop])
+        return self._rows_of_codes(column, self._matching_codes(column, value))
+
+    def positions(self, filters):
+        # sorted row positions matching every filter, filters[column] is (kind, value)
+        if not filters:
+            return np.arange(self.row_count)
+        matches = sorted((self.rows(column, kind, value) for column, (kind, value) in filters.items()), key=len)
+        positions = matches[0]
+        for rows in matches[1:]:
+            positions = np.intersect1d(positions, rows, assume_unique=True)
+        return positions
+
+
+# the index is built once per version of the dataset and shared by every session
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _load_filter_index(path, fingerprint, clean):
+    def build():
+        video_game = load_video_games(clean=clean, path=path)
+        with stage('filter_index'):
+            return FilterIndex(video_game)
+
+    # a restart reads the index of the current version from the registry instead of building it again
+    return load_artifact('filter_index.clean' if clean else 'filter_index', build, path)
+
+
+def load_filter_index(clean=False, path=DATA_PATH):
+    # index of the same frame as load_video_games(clean, path)
+    return _load_filter_index(path, file_fingerprint(path), clean)
@@ -0,0 +1,185 @@
+# import the libraries
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import streamlit as st
+
+from data_loader import DATA_PATH, file_fingerprint, load_video_games
+from instrumentation import stage
+from name_search import fold
+from registry import load_artifact, read_artifact, write_artifact
+from sales_cube import REGIONS, sales_values
+from top_n import top_positions
+
+# a qualifier at the end of a name telling how the sales were tracked or which port the row is,
+# not a different game: "(JP sales)", "(weekly US sales)", "(DS version)", "(3DS)", "(RP-T)"...
+TITLE_QUALIFIER = r'(?i)\s*\((?:[^()]*\b(?:sales|versions?)\b[^()]*|rp-\w+|japan|north america|3ds|ds|cd)\)\s*$'
+
+
+def title_keys(names):
+    # the key of the title of every name: folded like the search, without the qualifier,
+    # the names of a game on every platform and their variants have the same key
+    names = pa.array(names, pa.large_string())
+    keys = fold(pc.replace_substring_regex(names, TITLE_QUALIFIER, '')).to_pandas()
+    # a name of punctuation only is its own title
+    return pd.Index(keys.where(keys != '', pd.Series(names.to_pandas()).str.lower()), dtype='str')
+
+
+class GameEntities:
+    # the games of the dataset as entities with a stable integer id, whatever their platform and name variant:
+    # - every name seen is mapped to the entity of its title key, a new key gets the next id so the ids of
+    #   the known games never change when rows are added or removed
+    # - the sales of every region and the number of rows of every platform are kept per entity and updated
+    #   by the delta of the rows, the table of the entities is small and keyed by the id, a refresh only
+    #   computes again the rows of the entities it touched
+
+    def __init__(self):
+        self.names = pd.Index([], dtype='str')
+        self.name_entities = np.empty(0, dtype=np.int32)
+        # title key and displayed name of every entity, by id, the name is the first one seen of the title
+        self.keys = pd.Index([], dtype='str')
+        self.titles = []
+        self.totals = np.zeros((0, len(REGIONS)))
+        # the platforms by code in the order they were seen, and the number of rows of every entity and platform
+        # sorted by entity << 16 | code: the platforms of an entity are a contiguous slice
+        self.platforms = pd.Index([], dtype='str')
+        self.platform_keys = np.empty(0, dtype=np.int64)
+        self.platform_counts = np.empty(0, dtype=np.int64)
+        self.table = self._table_rows(np.empty(0, dtype=np.int64))
+
+    def _entities_of_names(self, names):
+        # id of the entity of every distinct name, only the names never seen are keyed
+        known = self.names.get_indexer(names)
+        new = names[known < 0]
+        if len(new):
+            keys = title_keys(new)
+            # the first name of every title without an entity yet gives it its id and its displayed name
+            first = ~keys.duplicated() & (self.keys.get_indexer(keys) < 0)
+            self.keys = self.keys.append(keys[first])
+            self.titles += list(new[first])
+            self.names = self.names.append(new)
+            self.name_entities = np.concatenate([self.name_entities, self.keys.get_indexer(keys).astype(np.int32)])
+            known = self.names.get_indexer(names)
+        return self.name_entities[known]
+
+    def entities_of_rows(self, rows):
+        # id of the entity of every row, through the codes of the names so each distinct name is looked up once
+        names = rows['Name'].cat.remove_unused_categories()
+        entities = self._entities_of_names(pd.Index(names.cat.categories, dtype='str'))
+        return entities[names.cat.codes.to_numpy()]
+
+    def _platform_codes(self, platforms):
+        # code of the platform of every row, a platform never seen gets the next code
+        platforms = pd.Index(platforms.astype('str'))
+        unseen = platforms[self.platforms.get_indexer(platforms) < 0].unique()
+        if len(unseen):
+            self.platforms = self.platforms.append(unseen)
+        return self.platforms.get_indexer(platforms).astype(np.int64)
+
+    def _count_platforms(self, keys, counts):
+        # add the counts of the (entity, platform) keys, the keys left without rows are dropped
+        positions = np.searchsorted(self.platform_keys, keys)
+        found = positions < len(self.platform_keys)
+        found[found] = self.platform_keys[positions[found]] == keys[found]
+        self.platform_counts[positions[found]] += counts[found]
+        if not found.all():
+            self.platform_keys = np.insert(self.platform_keys, positions[~found], keys[~found])
+            self.platform_counts = np.insert(self.platform_counts, positions[~found], counts[~found])
+        if (counts < 0).any():
+            kept = self.platform_counts > 0
+            self.platform_keys, self.platform_counts = self.platform_keys[kept], self.platform_counts[kept]
+
+    def refresh(self, added, removed=None):
+        # add the sales and the platforms of the added rows and take off those of the removed rows,
+        # the rows are kept by the cleaning so every row has a name
+        with stage('game_entities'):
+            touched = [np.empty(0, dtype=np.int64)]
+            for rows, sign in ((added, 1), (removed, -1)):
+                if rows is None or not len(rows):
+                    continue
+                entities = self.entities_of_rows(rows).astype(np.int64)
+                if len(self.totals) < len(self.keys):
+                    self.totals = np.vstack([self.totals, np.zeros((len(self.keys) - len(self.totals), len(REGIONS)))])
+                # the sales of every entity of the rows, summed by the position of the entity among them
+                rows_entities, inverse = np.unique(entities, return_inverse=True)
+                sales = sales_values(rows).to_numpy()
+                self.totals[rows_entities] += sign * np.column_stack(
+                    [np.bincount(inverse, weights=sales[:, column], minlength=len(rows_entities))
+                     for column in range(len(REGIONS))])
+                keys, counts = np.unique((entities << 16) | self._platform_codes(rows['Platform']), return_counts=True)
+                self._count_platforms(keys, sign * counts)
+                touched.append(rows_entities)
+            touched = np.unique(np.concatenate(touched))
+            # the sales have 2 decimals, rounding drops the noise of the subtractions
+            self.totals[touched] = self.totals[touched].round(2)
+            # the rows of the touched entities are computed again and replace theirs in the table
+            kept = self.table[~self.table.index.isin(touched)]
+            self.table = pd.concat([kept, self._table_rows(touched)]).sort_index() if len(kept) else \
+                self._table_rows(touched)
+        return self
+
+    def _table_rows(self, entities):
+        # name, platforms and sales of the entities with at least one row, indexed by the id of the entity
+        starts = np.searchsorted(self.platform_keys, entities << 16)
+        lengths = np.searchsorted(self.platform_keys, (entities + 1) << 16) - starts
+        entities, starts, lengths = entities[lengths > 0], starts[lengths > 0], lengths[lengths > 0]
+        # the platforms of every entity in the order of their names, joined by arrow in one pass
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        codes = (self.platform_keys[positions] & 0xffff).astype(np.int64)
+        owners = np.repeat(np.arange(len(entities)), lengths)
+        names = np.asarray(self.platforms, dtype=object)
+        codes = codes[np.lexsort((names[codes], owners))] if len(codes) else codes
+        platforms = pc.binary_join(pa.ListArray.from_arrays(pa.array(offsets, pa.int32()),
+                                                            pa.array(names[codes], pa.string())), ', ')
+        table = pd.DataFrame(self.totals[entities], index=pd.Index(entities, name='Entity'), columns=REGIONS)
+        table.insert(0, 'Name', np.array([self.titles[entity] for entity in entities], dtype=object))
+        table.insert(1, 'Platforms', platforms.to_numpy(zero_copy_only=False))
+        return table
+
+    def top(self, region, n=None):
+        # the n best selling entities of the region, equal sales by name like the rankings of the cube,
+        # the ids depend on the order the names were appended in and a full build would order them otherwise
+        positions = top_positions(self.table[[region]].to_numpy(), self.table['Name'].to_numpy(), n)[0]
+        return self.table.iloc[positions]
+
+
+def read_game_entities(source_hash, path=DATA_PATH):
+    # the entities of this version of the dataset, None when they were never stored
+    return read_artifact('game_entities', source_hash, path)
+
+
+def write_game_entities(entities, source_hash, path=DATA_PATH):
+    write_artifact('game_entities', entities, source_hash, path)
+
+
+def read_or_build_game_entities(path=DATA_PATH):
+    # built from the cleaned rows when no version of the dataset stored them, append.py refreshes them
+    return load_artifact('game_entities', lambda: GameEntities().refresh(load_video_games(path=path)), path)
+
+
+# the entities are read once per version of the dataset and shared by every session
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _load_game_entities(path, fingerprint):
+    return read_or_build_game_entities(path)
+
+
+def load_game_entities(path=DATA_PATH):
+    return _load_game_entities(path, file_fingerprint(path))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the game entities of the dataset, the games merged across '
+                                                 'platforms and name variants, and show the best selling ones.')
+    parser.add_argument('--path', default=DATA_PATH, help='dataset to index, csv or parquet')
+    parser.add_argument('--region', default='Global_Sales', choices=REGIONS, help='region of the ranking')
+    parser.add_argument('-n', type=int, default=10, help='number of games shown')
+    args = parser.parse_args()
+    # through the module so the stored entities are of its class, not of this script
+    import game_entities
+    entities = game_entities.load_game_entities(args.path)
+    print('{:,} names merged in {:,} games'.format(len(entities.names), len(entities.table)))
+    print(entities.top(args.region, args.n)[['Name', 'Platforms', args.region]].to_string())
@@ -0,0 +1,160 @@
+# import the libraries
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DATA_PATH
+from dataset_schema import STORAGE_SCHEMA
+from ingest import write_parquet_chunks
+
+# the regions, Global_Sales is their sum
+REGION_COLUMNS = ['NA_Sales', 'EU_Sales', 'JP_Sales', 'Other_Sales']
+# the review columns are missing together, their null pattern is reproduced as a whole
+REVIEW_COLUMNS = ['Critic_Score', 'Critic_Count', 'User_Score', 'User_Count', 'Developer', 'Rating']
+# standard deviation of the log of the random factor applied to the sales of the real games
+SALES_SPREAD = 0.3
+
+
+def frequencies(values):
+    # distinct values, missing values included, and their probability
+    counts = values.value_counts(dropna=False, normalize=True)
+    return counts.index.to_numpy(dtype=object), counts.to_numpy()
+
+
+def learn_profile(video_game):
+    # the distributions of the real dataset the synthetic rows are drawn from
+    profile = {}
+    # the platform and the publisher are drawn together so publishers stay on their platforms
+    profile['platform_publisher'] = frequencies(video_game[['Platform', 'Publisher']].apply(tuple, axis=1))
+    # the genre and the year of release depend on the platform (lifespan of the consoles),
+    # the genre is only missing on the rows without a name, like in the real dataset
+    profile['genre'] = {platform: frequencies(rows.dropna()) for platform, rows in video_game.groupby('Platform')['Genre']}
+    profile['year'] = {platform: frequencies(rows) for platform, rows in video_game.groupby('Platform')['Year_of_Release']}
+    # the regional sales are drawn from the real games of the same platform and scaled by a random factor,
+    # which keeps the long tail of the best sellers and the regional skew of each platform
+    regions = video_game[REGION_COLUMNS].to_numpy(dtype='float64')
+    profile['regions'] = {platform: regions[rows] for platform, rows in video_game.groupby('Platform').indices.items()}
+    # the missing names, and the share of distinct names as the same game is released on several platforms
+    profile['name_null_rate'] = video_game['Name'].isna().mean()
+    names = video_game['Name'].dropna()
+    profile['distinct_name_ratio'] = names.nunique() / max(1, len(names))
+    words = names.str.split()
+    profile['name_words'] = frequencies(words.str.len())
+    profile['vocabulary'] = np.array(sorted(set(word for title in words for word in title)), dtype=object)
+    # the null pattern of the review columns, and the values of each column when present
+    patterns = video_game[REVIEW_COLUMNS].isna()
+    profile['review_patterns'] = frequencies(patterns.apply(tuple, axis=1))
+    profile['review_values'] = {column: video_game[column].dropna().to_numpy(dtype=object) for column in REVIEW_COLUMNS}
+    return profile
+
+
+def draw(rng, choices, size):
+    # draw size values from a (values, probabilities) pair
+    values, probabilities = choices
+    return values[rng.choice(len(values), size=size, p=probabilities)]
+
+
+def name_pool_size(rows, distinct_ratio):
+    # number of name ids to draw rows uniform ids from so that distinct_ratio of the rows get distinct names,
+    # drawing rows ids out of pool gives pool * (1 - exp(-rows / pool)) distinct ids
+    low, high = 1e-6, 50.0
+    for _ in range(60):
+        draws_per_id = (low + high) / 2
+        if (1 - np.exp(-draws_per_id)) / draws_per_id > distinct_ratio:
+            low = draws_per_id
+        else:
+            high = draws_per_id
+    return max(1, int(rows / draws_per_id))
+
+
+def synthetic_names(rng, profile, size):
+    # titles made of words of the real titles, a name id is shared by several rows like the ports of a game
+    ids = rng.integers(0, profile['name_pool_size'], size=size).astype('uint64')
+    vocabulary = profile['vocabulary']
+    word_counts, word_probabilities = profile['name_words']
+    cumulative = np.cumsum(word_probabilities)
+    # hash the id so the same id always gives the same title, whatever the chunk it is drawn in
+    with np.errstate(over='ignore'):
+        hashes = ids * np.uint64(0x9E3779B97F4A7C15) + np.uint64(0x632BE59BD9B4E019)
+        lengths = word_counts[np.minimum(np.searchsorted(cumulative, (hashes >> np.uint64(11)) / 2.0**53),
+                                         len(word_counts) - 1)].astype(int)
+        positions = []
+        for slot in range(lengths.max()):
+            hashes = hashes * np.uint64(0xBF58476D1CE4E5B9) + np.uint64(slot + 1)
+            positions.append(vocabulary[(hashes >> np.uint64(17)) % np.uint64(len(vocabulary))])
+    names = np.array([' '.join(words[:length]) for length, words in zip(lengths, zip(*positions))], dtype=object)
+    names[rng.random(size) < profile['name_null_rate']] = None
+    return names
+
+
+def generate_chunk(rng, profile, size):
+    # one chunk of synthetic rows with the columns of Video_Games.csv
+    pairs = draw(rng, profile['platform_publisher'], size)
+    platforms = np.array([pair[0] for pair in pairs], dtype=object)
+    chunk = pd.DataFrame({'Name': synthetic_names(rng, profile, size),
+                          'Platform': platforms,
+                          'Year_of_Release': np.full(size, np.nan),
+                          'Genre': np.full(size, None, dtype=object),
+                          'Publisher': np.array([pair[1] for pair in pairs], dtype=object)})
+    regions = np.empty((size, len(REGION_COLUMNS)))
+    scales = rng.lognormal(0.0, SALES_SPREAD, size=size)
+    for platform in pd.unique(platforms):
+        rows = np.flatnonzero(platforms == platform)
+        chunk.loc[rows, 'Genre'] = draw(rng, profile['genre'][platform], len(rows))
+        chunk.loc[rows, 'Year_of_Release'] = draw(rng, profile['year'][platform], len(rows)).astype('float64')
+        platform_regions = profile['regions'][platform]
+        regions[rows] = platform_regions[rng.integers(0, len(platform_regions), size=len(rows))] * scales[rows, None]
+    # the sales are in millions with 2 decimals, the global sales are the sum of the regions
+    regions = regions.round(2)
+    for position, column in enumerate(REGION_COLUMNS):
+        chunk[column] = regions[:, position]
+    chunk['Global_Sales'] = regions.sum(axis=1).round(2)
+    patterns = np.array(list(draw(rng, profile['review_patterns'], size)), dtype=bool)
+    for position, column in enumerate(REVIEW_COLUMNS):
+        values = profile['review_values'][column]
+        column_values = values[rng.integers(0, len(values), size=size)]
+        column_values[patterns[:, position]] = None
+        chunk[column] = column_values
+    chunk.loc[chunk['Name'].isna(), 'Genre'] = None
+    return chunk.astype(STORAGE_SCHEMA)
+
+
+def generate_chunks(profile, rows, chunk_size=500000, seed=0):
+    # yield the synthetic rows chunk by chunk, only one chunk is held in memory
+    rng = np.random.default_rng(seed)
+    profile = dict(profile, name_pool_size=name_pool_size(rows, profile['distinct_name_ratio']))
+    for start in range(0, rows, chunk_size):
+        yield generate_chunk(rng, profile, min(chunk_size, rows - start))
+
+
+def write_dataset(chunks, output):
+    # stream the chunks to a csv file, or to a parquet file when the output ends with .parquet
+    if output.endswith('.parquet'):
+        return write_parquet_chunks(chunks, output)
+    temporary_path = output + '.tmp'
+    with open(temporary_path, 'w', newline='') as output_file:
+        for position, chunk in enumerate(chunks):
+            chunk.to_csv(output_file, header=position == 0, index=False)
+    os.replace(temporary_path, output)
+    return output
+
+
+def generate(output, rows, source=DATA_PATH, chunk_size=500000, seed=0):
+    # learn the distributions of the source and write rows synthetic rows with the same schema
+    profile = learn_profile(pd.read_csv(source))
+    return write_dataset(generate_chunks(profile, rows, chunk_size, seed), output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic dataset with the schema and the distributions '
+                                                 'of Video_Games.csv.')
+    parser.add_argument('output', help='file to write, parquet when it ends with .parquet and csv otherwise')
+    parser.add_argument('--rows', type=int, required=True, help='number of rows to generate')
+    parser.add_argument('--source', default=DATA_PATH, help='csv file the distributions are learned from')
+    parser.add_argument('--chunk-size', type=int, default=500000, help='rows generated and written at a time')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random generator')
+    args = parser.parse_args()
+    generate(args.output, args.rows, args.source, args.chunk_size, args.seed)
+    print('{:,} rows written to {}'.format(args.rows, args.output))
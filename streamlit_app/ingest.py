@@ -0,0 +1,153 @@
+# import the libraries
+import argparse
+import os
+import pickle
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_loader import DATA_PATH, columnar_path, content_hash, drop_incomplete_rows
+from dataset_schema import STORAGE_SCHEMA, apply_schema
+from name_search import SearchSums, write_search_index
+from sales_cube import RANKING_LIMITS, REGIONS, assemble_cube, cube_sums, limited_rankings, merge_sums, write_cube
+from top_n import top_positions
+
+# rows per row group of the parquet files, a row group is the unit of work of the pre-aggregation workers
+ROW_GROUP_SIZE = 100000
+
+
+def write_columnar(video_game, output, source_hash=None):
+    # store the typed frame as a parquet file, the hash of the csv it comes from is kept in the metadata
+    # so the app can tell if the copy is up to date
+    table = pa.Table.from_pandas(video_game, preserve_index=False)
+    if source_hash is not None:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'source_hash': source_hash.encode()})
+    # write to a temporary file first so a reader never sees a half written file
+    temporary_path = output + '.tmp'
+    pq.write_table(table, temporary_path, row_group_size=ROW_GROUP_SIZE)
+    os.replace(temporary_path, output)
+    return output
+
+
+def ingest(source=DATA_PATH, output=None):
+    # parse the csv once with the declared schema and store it as a typed parquet file,
+    # with the search index of the names so the app does not build it on start
+    video_game = apply_schema(pd.read_csv(source))
+    output = write_columnar(video_game, output or columnar_path(source), content_hash(source))
+    write_search_index(source)
+    return output, len(video_game)
+
+
+def write_parquet_chunks(chunks, output, metadata=None):
+    # stream frames with the same columns to one parquet file, every chunk is cast to the schema of the first one
+    temporary_path = output + '.tmp'
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False, schema=writer.schema if writer else None)
+            if writer is None:
+                schema = table.schema.with_metadata({**(table.schema.metadata or {}), **(metadata or {})})
+                writer = pq.ParquetWriter(temporary_path, schema)
+                table = table.replace_schema_metadata(schema.metadata)
+            writer.write_table(table, row_group_size=ROW_GROUP_SIZE)
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(temporary_path, output)
+    return output
+
+
+class SpilledSums:
+    # sums per label for the dimensions with about as many labels as rows: the partial sums of every chunk
+    # are spilled to partition files by hash of the label, and each partition is summed on its own at the end
+
+    def __init__(self, directory, partitions=64):
+        self.paths = [os.path.join(directory, 'partition_{}.pkl'.format(part)) for part in range(partitions)]
+
+    def add(self, sums):
+        parts = pd.util.hash_array(sums.index.to_numpy(dtype=object)) % len(self.paths)
+        for part, partial in sums.groupby(parts):
+            with open(self.paths[part], 'ab') as partition_file:
+                pickle.dump(partial, partition_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def partition_sums(self):
+        # the complete sums of every partition, one partition in memory at a time
+        for path in self.paths:
+            if not os.path.exists(path):
+                continue
+            partials = []
+            with open(path, 'rb') as partition_file:
+                while True:
+                    try:
+                        partials.append(pickle.load(partition_file))
+                    except EOFError:
+                        break
+            yield pd.concat(partials).groupby(level=0).sum()
+
+    def ranked(self, limit):
+        # the labels of a partition never appear in another one, so the best sums overall are among the best
+        # sums of each partition, one more is kept to know the floor of the ranking
+        best = []
+        for sums in self.partition_sums():
+            # rounded like rank_regions() so the cut between equal sums is the one of the whole ranking
+            sums = sums.round(2)
+            positions = top_positions(sums[REGIONS].to_numpy(), sums.index.to_numpy(), limit + 1)
+            best.append(sums.iloc[np.unique(np.concatenate(positions))])
+        return limited_rankings(pd.concat(best), limit)
+
+
+def stream_ingest(source=DATA_PATH, output=None, chunksize=100000):
+    # ingest a csv of any size in chunks: every chunk is written to the parquet copy with the storage dtypes,
+    # then cleaned with the rules of data_loader.clean_video_games and folded into running sums of sales,
+    # the sums of the names are spilled to disk so the peak memory depends on the chunk size, not on the rows
+    output = output or columnar_path(source)
+    source_hash = content_hash(source)
+    running = None
+    rows = {'read': 0, 'kept': 0}
+    spill_directory = tempfile.TemporaryDirectory(prefix='video_game_ingest_')
+    spilled = {dimension: SpilledSums(spill_directory.name) for dimension in RANKING_LIMITS}
+    search_sums = SearchSums()
+
+    def chunks():
+        nonlocal running
+        for chunk in pd.read_csv(source, chunksize=chunksize):
+            rows['read'] += len(chunk)
+            chunk = chunk.astype(STORAGE_SCHEMA)
+            yield chunk
+            search_sums.add(chunk)
+            cleaned = drop_incomplete_rows(chunk)
+            rows['kept'] += len(cleaned)
+            # the missing years are only known at the end, the cube sums keep their sales apart until then
+            sums = cube_sums(cleaned)
+            for dimension, spilled_sums in spilled.items():
+                spilled_sums.add(sums.pop(dimension))
+            running = sums if running is None else merge_sums([running, sums])
+
+    write_parquet_chunks(chunks(), output, {b'source_hash': source_hash.encode()})
+    with spill_directory:
+        ranked = {dimension: spilled_sums.ranked(RANKING_LIMITS[dimension]) for dimension, spilled_sums in spilled.items()}
+    cube = assemble_cube(running, ranked)
+    write_cube(cube, source_hash, source)
+    write_search_index(source, search_sums.search_index())
+    return output, rows['read'], rows['kept'], cube['years']['fill']
+
+
+if __name__ == '__main__':
+    # convert the csv to the columnar format read by the app
+    parser = argparse.ArgumentParser(description='Convert the video game csv to a typed parquet file.')
+    parser.add_argument('--source', default=DATA_PATH, help='csv file to convert')
+    parser.add_argument('--output', default=None, help='parquet file to write, next to the csv by default')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='stream the csv by chunks of this many rows and build the sales cube on the way, '
+                             'for files that do not fit in memory')
+    args = parser.parse_args()
+    if args.chunksize:
+        output, rows, kept, year_fill = stream_ingest(args.source, args.output, args.chunksize)
+        print('{:,} rows written to {}, {:,} kept by the cleaning, missing years filled with {}'.format(
+            rows, output, kept, year_fill))
+    else:
+        output, rows = ingest(args.source, args.output)
+        print('{:,} rows written to {}'.format(rows, output))
@@ -0,0 +1,220 @@
+# import the libraries
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+import plotly.io as pio
+import pyarrow as pa
+import streamlit as st
+
+# the stages of every run are measured when VIDEO_GAMES_PROFILE is set, or for one session with ?profile=1 in the url
+PROFILE_VARIABLE = 'VIDEO_GAMES_PROFILE'
+PROFILE_PARAMETER = 'profile'
+# file rewritten after every measured run with the totals of every stage since the start of the process,
+# in the text format of prometheus so the textfile collector of node_exporter can scrape it
+METRICS_VARIABLE = 'VIDEO_GAMES_METRICS'
+METRICS = [
+    ('runs', 'counter', 'Number of measured runs of the stage.'),
+    ('wall_seconds', 'counter', 'Wall time spent in the stage.'),
+    ('cpu_seconds', 'counter', 'CPU time of the thread spent in the stage.'),
+    ('allocated_bytes', 'counter', 'Peak memory allocated by the stage, summed over the runs.'),
+    ('payload_bytes', 'counter', 'Bytes sent to the browser by the stage.'),
+]
+ENABLED_VALUES = ('1', 'true', 'yes', 'on')
+
+# one json line per measured stage
+logger = logging.getLogger('video_game_analysis.stages')
+
+# the run of the current thread, streamlit runs the script of every session in its own thread
+_current = threading.local()
+# totals per stage since the start of the process, shared by every session
+_totals = {}
+# the threads of the measured runs in progress, memory allocations are only traced while there is one
+_measured_threads = set()
+_lock = threading.Lock()
+
+
+def is_enabled():
+    return getattr(_current, 'stages', None) is not None
+
+
+def requested():
+    # the environment turns the measures on for every session, the query parameter for one
+    if os.environ.get(PROFILE_VARIABLE, '').lower() in ENABLED_VALUES:
+        return True
+    return st.query_params.get(PROFILE_PARAMETER, '').lower() in ENABLED_VALUES
+
+
+def start_run(page):
+    # called at the top of a page, the stages of the run are measured if the run asks for it
+    _current.stages = [] if requested() else None
+    _current.page = page
+    _current.open = []
+    _current.start = time.perf_counter()
+    update_tracing(is_enabled())
+
+
+def update_tracing(measured):
+    # tracing slows every allocation of the process down, it only runs while a measured run is in progress
+    # a run stopped by a rerun or an exception never reaches finish_run(): streamlit starts the next run of the
+    # session on a new thread and the thread of the stopped run ends, the runs of ended threads are dropped
+    thread = threading.current_thread()
+    with _lock:
+        _measured_threads.difference_update([other for other in list(_measured_threads)
+                                             if other is thread or not other.is_alive()])
+        if measured:
+            _measured_threads.add(thread)
+        if _measured_threads and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not _measured_threads and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+@contextmanager
+def stage(name, payload_bytes=None):
+    # measure the wall time, the cpu time and the peak allocations of the block, nothing when the run is not measured
+    # the tracing of allocations is global to the process, concurrent measured runs add to each other's peaks
+    if not is_enabled():
+        yield
+        return
+    tracing = tracemalloc.is_tracing()
+    record = {'stage': name, 'depth': len(_current.open), 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+              'allocated_bytes': 0, 'payload_bytes': payload_bytes}
+    if tracing:
+        # the peak is reset for this stage, the enclosing stages keep the peak reached so far
+        current, peak = tracemalloc.get_traced_memory()
+        for parent in _current.open:
+            parent['peak'] = max(parent['peak'], peak)
+        tracemalloc.reset_peak()
+        record.update(before=current, peak=current)
+    # the stages are listed in the order they started, nested stages under the stage that ran them
+    _current.stages.append(record)
+    _current.open.append(record)
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        record['wall_seconds'] = time.perf_counter() - wall
+        record['cpu_seconds'] = time.thread_time() - cpu
+        _current.open.pop()
+        if tracing and tracemalloc.is_tracing():
+            peak = max(record.pop('peak'), tracemalloc.get_traced_memory()[1])
+            record['allocated_bytes'] = max(0, peak - record.pop('before'))
+            if _current.open:
+                _current.open[-1]['peak'] = max(_current.open[-1]['peak'], peak)
+
+
+@contextmanager
+def thread_stages(measured):
+    # measure the stages of work done in another thread for a measured run, the records are collected
+    # apart and given back to the run by add_stages() on its own thread
+    _current.stages, _current.open = ([] if measured else None), []
+    try:
+        yield _current.stages
+    finally:
+        _current.stages = None
+
+
+def add_stages(records):
+    # the stages measured by thread_stages(), nested under the stages open in the run
+    if is_enabled():
+        for record in records or []:
+            record['depth'] += len(_current.open)
+            _current.stages.append(record)
+
+
+def plotly_chart(fig, name, **kwargs):
+    # st.plotly_chart measured as a stage, with the size of the figure json sent to the browser
+    if not is_enabled():
+        return st.plotly_chart(fig, **kwargs)
+    payload_bytes = len(pio.to_json(fig, validate=False))
+    with stage('chart/' + name, payload_bytes):
+        return st.plotly_chart(fig, **kwargs)
+
+
+def dataframe(frame, name, **kwargs):
+    # st.dataframe measured as a stage, with the size of the arrow stream sent to the browser
+    if not is_enabled():
+        return st.dataframe(frame, **kwargs)
+    table = pa.Table.from_pandas(frame)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    with stage('dataframe/' + name, sink.getvalue().size):
+        return st.dataframe(frame, **kwargs)
+
+
+def log_stages(page, stages):
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    for record in stages:
+        logger.info(json.dumps({'page': page, **record}))
+
+
+def metrics_text(totals):
+    # the totals in the text format of prometheus, one sample per page and stage
+    lines = []
+    for metric, kind, description in METRICS:
+        name = 'video_game_stage_{}_total'.format(metric)
+        lines.append('# HELP {} {}'.format(name, description))
+        lines.append('# TYPE {} {}'.format(name, kind))
+        for (page, stage_name), values in sorted(totals.items()):
+            labels = 'page="{}",stage="{}"'.format(*[label.replace('\\', '\\\\').replace('"', '\\"')
+                                                      for label in (page, stage_name)])
+            lines.append('{}{{{}}} {}'.format(name, labels, values[metric]))
+    return '\n'.join(lines) + '\n'
+
+
+def write_metrics(path):
+    with _lock:
+        text = metrics_text(_totals)
+    temporary_path = '{}.{}.tmp'.format(path, threading.get_ident())
+    with open(temporary_path, 'w') as metrics_file:
+        metrics_file.write(text)
+    os.replace(temporary_path, path)
+
+
+def show_panel(stages, wall_seconds):
+    # the stages of the run in the sidebar
+    table = pd.DataFrame([{
+        'stage': '· '*record['depth'] + record['stage'],
+        'wall ms': record['wall_seconds']*1000,
+        'cpu ms': record['cpu_seconds']*1000,
+        'allocated KiB': record['allocated_bytes'] / 1024,
+        'payload KiB': None if record['payload_bytes'] is None else record['payload_bytes'] / 1024,
+    } for record in stages])
+    with st.sidebar.expander('Stage timings', expanded=True):
+        st.caption('run of {:,.0f} ms, the stages of cached functions only appear when the cache was missed'.format(
+            wall_seconds*1000))
+        if len(table):
+            st.dataframe(table.round(1), hide_index=True)
+
+
+def finish_run():
+    # called at the end of a page: show, log and export the stages of the run
+    if not is_enabled():
+        return
+    stages, page = _current.stages, _current.page
+    wall_seconds = time.perf_counter() - _current.start
+    _current.stages = None
+    update_tracing(False)
+    show_panel(stages, wall_seconds)
+    log_stages(page, stages)
+    with _lock:
+        for record in stages:
+            values = _totals.setdefault((page, record['stage']), {metric: 0 for metric, _, _ in METRICS})
+            values['runs'] += 1
+            for metric in ('wall_seconds', 'cpu_seconds', 'allocated_bytes'):
+                values[metric] += record[metric]
+            values['payload_bytes'] += record['payload_bytes'] or 0
+    if os.environ.get(METRICS_VARIABLE):
+        write_metrics(os.environ[METRICS_VARIABLE])
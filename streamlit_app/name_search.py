@@ -0,0 +1,201 @@
+# import the libraries
+import unicodedata
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import streamlit as st
+
+from data_loader import DATA_PATH, content_hash, file_fingerprint, read_dataset
+from instrumentation import stage
+from registry import load_artifact, write_artifact
+
+# the columns searched by name, the distinct values are ranked by their sales when they match as well
+SEARCH_COLUMNS = ['Name', 'Publisher']
+# values sharing fewer trigrams than this with the query, relative to the size of both, are not returned
+MIN_SIMILARITY = 0.3
+# values whose trigrams are taken at once, the temporary arrays of a batch take a few bytes per byte of its text
+TRIGRAM_BATCH = 100000
+
+
+def fold(values):
+    # the text compared by the search: lowercase, without accents, the words separated by one space,
+    # so "Pokémon: Yellow" and "pokemon yellow" are the same, done by arrow on the whole array at once
+    values = pc.replace_substring_regex(values, r'[^\p{L}\p{N}\p{M}]+', ' ')
+    values = pc.utf8_normalize(values, 'NFKD')
+    values = pc.replace_substring_regex(values, r'\p{Mn}+', '')
+    values = pc.utf8_lower(values)
+    values = pc.replace_substring_regex(values, r'[^\p{L}\p{N}]+', ' ')
+    return pc.utf8_trim_whitespace(values)
+
+
+def fold_text(text):
+    # fold of one text, the same steps in python as compiling the patterns of fold() costs more than a short query
+    text = ''.join(letter if unicodedata.category(letter)[0] in 'LNM' else ' ' for letter in text)
+    text = ''.join(letter for letter in unicodedata.normalize('NFKD', text) if unicodedata.category(letter) != 'Mn')
+    text = ''.join(letter if unicodedata.category(letter)[0] in 'LN' else ' ' for letter in text.lower())
+    return ' '.join(text.split())
+
+
+def byte_trigrams(data):
+    # the overlapping 3 byte pieces of utf-8 text as integers, the bytes of several characters are compared as is
+    data = np.asarray(data, dtype=np.int32)
+    return (data[:-2] << 16) | (data[1:-1] << 8) | data[2:]
+
+
+def value_sales(values, sales):
+    # total sales of every category of a categorical column, indexed by the categories
+    codes = values.cat.codes.to_numpy()
+    known = codes >= 0
+    return pd.Series(np.bincount(codes[known], weights=sales.to_numpy(dtype='float64', na_value=0)[known],
+                                 minlength=len(values.cat.categories)), index=values.cat.categories)
+
+
+def trigram_pairs(folded, first=0):
+    # the distinct (trigram, code) pairs of the values, as trigram << 32 | code, the codes counted from first,
+    # every value is padded with spaces so its first and last letters count too
+    space = pa.scalar(' ', pa.large_string())
+    padded = pc.binary_join_element_wise(space, folded, space, pa.scalar('', pa.large_string()))
+    offsets = np.frombuffer(padded.buffers()[1], dtype=np.int64)[padded.offset:padded.offset + len(padded) + 1]
+    data = np.frombuffer(padded.buffers()[2], dtype=np.uint8)[offsets[0]:offsets[-1]]
+    offsets = offsets - offsets[0]
+    lengths = np.diff(offsets)
+    # a trigram starting in a value must end in it
+    starts = np.flatnonzero(np.arange(len(data) - 2) + 2 < np.repeat(offsets[1:], lengths)[:-2])
+    owners = np.repeat(np.arange(first, first + len(lengths), dtype=np.int64), lengths)[starts]
+    return np.unique((byte_trigrams(data)[starts].astype(np.int64) << 32) | owners)
+
+
+class NameSearch:
+    # search index over the distinct values of a categorical column, built once per version of the dataset:
+    # - fuzzy search: a trigram index over the folded values, the values sharing the most trigrams with the
+    #   query rank first, so typos, accents and word order still match, then the values with the most sales
+    # - completion: the folded values sorted, the values starting with a prefix are one binary search away
+    # the values are the codes of the categories of the column, the same in every frame read from the dataset
+
+    def __init__(self, sales):
+        # sales holds the total sales of every value, indexed by the categories of the column,
+        # it orders the values equally similar to a query
+        self.values = sales.index
+        self.sales = sales.to_numpy(dtype='float64').round(2)
+        folded = fold(pa.array(self.values, pa.large_string()))
+        self._index_trigrams(folded)
+        # the values sorted by their folded text, as ordered by arrow and python: by code point
+        self.completion_order = pc.sort_indices(folded).to_numpy().astype(np.int32)
+        self.sorted_folded = folded.take(self.completion_order)
+
+    def _index_trigrams(self, folded):
+        # the trigrams of every value stored as sorted (trigram, code) pairs: the codes of a trigram are
+        # a contiguous slice of self.codes, the pairs are taken by batches of values to bound the temporary arrays
+        pairs = np.concatenate([np.empty(0, dtype=np.int64)] +
+                               [trigram_pairs(folded.slice(first, TRIGRAM_BATCH), first)
+                                for first in range(0, len(folded), TRIGRAM_BATCH)])
+        pairs.sort()
+        # a trigram fits in 24 bits and a code in 32, both halves are kept as int32 and the pairs dropped
+        grams = (pairs >> 32).astype(np.int32)
+        self.codes = pairs.astype(np.int32)
+        del pairs
+        first = np.flatnonzero(np.concatenate([[True], grams[1:] != grams[:-1]]))
+        self.grams = grams[first]
+        self.gram_offsets = np.append(first, len(grams))
+        # number of distinct trigrams of every value, the similarity is relative to it
+        self.gram_counts = np.bincount(self.codes, minlength=len(self.values)).astype(np.int32)
+
+    def search(self, query, n=20):
+        # codes of the n values most similar to the query with their similarity, in descending order
+        folded = fold_text(query)
+        if not folded:
+            return np.empty(0, dtype=np.int32), np.empty(0)
+        grams = np.unique(byte_trigrams(np.frombuffer(' {} '.format(folded).encode(), dtype=np.uint8)))
+        found = np.searchsorted(self.grams, grams)
+        found = found[(found < len(self.grams)) & (self.grams[np.minimum(found, len(self.grams) - 1)] == grams)]
+        if not len(found):
+            return np.empty(0, dtype=np.int32), np.empty(0)
+        candidates = np.concatenate([self.codes[self.gram_offsets[gram]:self.gram_offsets[gram + 1]]
+                                     for gram in found])
+        # the dice coefficient of the trigrams of the query and of every value sharing at least one
+        candidates, shared = np.unique(candidates, return_counts=True)
+        similarity = 2 * shared / (len(grams) + self.gram_counts[candidates])
+        kept = similarity >= MIN_SIMILARITY
+        candidates, similarity = candidates[kept], similarity[kept]
+        order = np.lexsort((-self.sales[candidates], -similarity))[:n]
+        return candidates[order], similarity[order]
+
+    def _lower_bound(self, text):
+        # position of the first folded value not below the text
+        low, high = 0, len(self.sorted_folded)
+        while low < high:
+            middle = (low + high) // 2
+            if self.sorted_folded[middle].as_py() < text:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def complete(self, prefix, n=5):
+        # the values starting with the prefix once folded, the best selling first, one value per folded text
+        folded = fold_text(prefix)
+        if not folded:
+            return []
+        start, stop = self._lower_bound(folded), self._lower_bound(folded + '\U0010ffff')
+        positions = np.arange(start, stop)[np.argsort(-self.sales[self.completion_order[start:stop]], kind='stable')]
+        completions, seen = [], set()
+        for position in positions:
+            text = self.sorted_folded[position].as_py()
+            if text not in seen:
+                seen.add(text)
+                completions.append(self.values[self.completion_order[position]])
+            if len(completions) == n:
+                break
+        return completions
+
+
+def build_search_index(video_game):
+    # a search index per searched column of the frame
+    with stage('search_index'):
+        return {column: NameSearch(value_sales(video_game[column], video_game['Global_Sales']))
+                for column in SEARCH_COLUMNS}
+
+
+class SearchSums:
+    # the sales of every value of the searched columns, summed over the chunks of a streamed ingest so the
+    # index is built without reading the columns back whole, only the distinct values are kept
+
+    def __init__(self):
+        self.sums = {column: pd.Series([], dtype='float64', index=pd.Index([], dtype='str'))
+                     for column in SEARCH_COLUMNS}
+
+    def add(self, chunk):
+        for column in SEARCH_COLUMNS:
+            sums = chunk.groupby(column)['Global_Sales'].sum()
+            self.sums[column] = self.sums[column].add(sums, fill_value=0)
+
+    def search_index(self):
+        # the values in the sorted order of the categories of the column, like build_search_index()
+        with stage('search_index'):
+            return {column: NameSearch(sums.sort_index()) for column, sums in self.sums.items()}
+
+
+def read_search_columns(path=DATA_PATH):
+    # only the searched columns and the sales are read, the categories are the ones of the whole frame
+    return read_dataset(path, columns=SEARCH_COLUMNS + ['Global_Sales'])
+
+
+def write_search_index(path=DATA_PATH, search_index=None):
+    # store the index of the current version of the dataset with the dataset, called at ingest,
+    # built from the searched columns of the dataset when it is not given
+    search_index = search_index or build_search_index(read_search_columns(path))
+    write_artifact('search_index', search_index, content_hash(path), path)
+
+
+# the index is read once per version of the dataset and shared by every session
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _load_search_index(path, fingerprint):
+    # built here only when the dataset was not ingested
+    return load_artifact('search_index', lambda: build_search_index(read_search_columns(path)), path)
+
+
+def load_search_index(path=DATA_PATH):
+    # search indexes of the columns of load_video_games(path=path), by column
+    return _load_search_index(path, file_fingerprint(path))
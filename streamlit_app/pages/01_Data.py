@@ -1,10 +1,21 @@
 # import the libraries 
-import pandas as pd
 import streamlit as st
 from streamlit_extras.dataframe_explorer import dataframe_explorer
 
-# import the dataset 
-video_game = pd.read_csv('streamlit_app/Data/Video_Games.csv')
+from data_loader import load_video_games
+from explorer import paginated_explorer, search_rows
+from filter_index import load_filter_index
+from instrumentation import dataframe, finish_run, stage, start_run
+from name_search import load_search_index
+
+# above this number of rows the data is browsed page by page by default
+FULL_VIEW_MAX_ROWS = 50000
+
+# measure the stages of the run when it is instrumented
+start_run('Data')
+
+# import the raw dataset, shared between sessions and reloaded only when the file changes
+video_game = load_video_games(clean=False)
 
 # Create a header for the page
 st.title('Data exploration')
@@ -16,10 +27,32 @@ with tab1:
     # initiate a title for the tab
     st.subheader('Exploration of Dataframe')
     
-    # use streamlit library to show dataframe
-    # create a filtering tool for the data exploration
-    filtered_video_game = dataframe_explorer(video_game, case=False)
-    st.dataframe(filtered_video_game, use_container_width=True)
+    # in the paginated view the filters run on the server and only the rows of the current page
+    # are sent to the browser, the full view sends the whole filtered dataframe
+    paginated = st.toggle('Paginated view', value=len(video_game) > FULL_VIEW_MAX_ROWS)
+
+    # search a game or a publisher by name with the index built at ingest, typos and accents included,
+    # only the rows of the best matches are explored
+    with stage('search'):
+        searched = search_rows(video_game, load_search_index())
+
+    if paginated:
+        # create a filtering tool for the data exploration and show the selected page
+        # the filters are resolved with indexes built once per version of the dataset
+        filter_index = load_filter_index()
+        with stage('filter'):
+            page = paginated_explorer(video_game, filter_index, searched)
+        dataframe(page, 'explorer', use_container_width=True)
+    else:
+        # use streamlit library to show dataframe
+        # create a filtering tool for the data exploration
+        # the explorer offers a multiselect for categorical columns, keep a text search for the
+        # columns with too many distinct values to list
+        explored = video_game if searched is None else video_game.iloc[searched]
+        with stage('filter'):
+            filtered_video_game = dataframe_explorer(explored.astype({'Name': 'str', 'Publisher': 'str', 'Developer': 'str'}),
+                                                     case=False)
+        dataframe(filtered_video_game, 'explorer', use_container_width=True)
 
 
 with tab2:
@@ -43,6 +76,9 @@ with tab2:
             # drop columns from index 10 to 16 becaus we won't use them for this analysis
             video_game.drop(video_game.iloc[:,10:16], inplace=True, axis=1)
 
+            # the sales columns, the only ones summed when grouping
+            sales_columns = ['NA_Sales', 'EU_Sales', 'JP_Sales', 'Other_Sales', 'Global_Sales']
+
             # check for null values
             video_game.isnull().sum()
 
@@ -119,7 +155,7 @@ with tab2:
             ## Analyze sales by region throughout the years
 
             # count the sum of sales grouped by years
-            sales_year = video_game.groupby('Year_of_Release').sum().reset_index()
+            sales_year = video_game.groupby('Year_of_Release')[sales_columns].sum().reset_index()
             sales_year
 
             # create lineplot of sales by year and region
@@ -137,7 +173,7 @@ with tab2:
             ## Analyze sales per platform
 
             # count the sum of sales per platform and sort by global sales
-            sales_platform = video_game.groupby('Platform').sum().sort_values('Global_Sales', ascending=False).reset_index()
+            sales_platform = video_game.groupby('Platform')[sales_columns].sum().sort_values('Global_Sales', ascending=False).reset_index()
             sales_platform
 
             # create bar plot for global sales per platform
@@ -182,7 +218,7 @@ with tab2:
             ## Analyze top 20 publishers
 
             # count the sum of sales by publisher sorted by descending
-            publisher_sales = video_game.groupby('Publisher').sum().sort_values('Global_Sales', ascending=False).reset_index()[:20]
+            publisher_sales = video_game.groupby('Publisher')[sales_columns].sum().sort_values('Global_Sales', ascending=False).reset_index()[:20]
             publisher_sales
 
             # create bar plot of top 20 publishers by global sales
@@ -223,7 +259,7 @@ with tab2:
             ## Analyze genres by sales  
 
             # count the sum of sales by genre sorted by global sales
-            genre_sales = video_game.groupby('Genre').sum().sort_values('Global_Sales', ascending=False).reset_index()
+            genre_sales = video_game.groupby('Genre')[sales_columns].sum().sort_values('Global_Sales', ascending=False).reset_index()
             genre_sales
 
             # create bar plot 
@@ -326,3 +362,6 @@ with tab2:
 
     # show the code and specify the language used
     st.code(code, language='python')
+
+# show the measures of the run in the sidebar when it is instrumented
+finish_run()
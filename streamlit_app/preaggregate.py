@@ -0,0 +1,66 @@
+# import the libraries
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pyarrow.parquet as pq
+
+from data_loader import ANALYSIS_COLUMNS, DATA_PATH, columnar_path, content_hash, drop_incomplete_rows, is_columnar_current
+from dataset_schema import apply_schema
+from ingest import ingest
+from sales_cube import assemble_cube, cube_sums, merge_sums, write_cube
+
+
+def positive_int(value):
+    # type of the --workers argument, 0 or a negative number of workers is refused instead of meaning every core
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError('{} is not a positive number of workers'.format(value))
+    return number
+
+
+def partial_sums(path, row_groups):
+    # the cube sums of some row groups of the parquet file, run in a worker process
+    table = pq.ParquetFile(path).read_row_groups(row_groups, columns=ANALYSIS_COLUMNS)
+    return cube_sums(drop_incomplete_rows(apply_schema(table.to_pandas())))
+
+
+def split_row_groups(path, parts):
+    # the row groups of the file split in at most parts contiguous runs of about the same size
+    return [list(run) for run in np.array_split(np.arange(pq.ParquetFile(path).num_row_groups), parts) if len(run)]
+
+
+def preaggregate(source=DATA_PATH, workers=None):
+    # build the sales cube of the source with a pool of processes, every worker sums a part of the rows
+    # of the parquet copy and the partial sums are merged, the parquet copy is ingested first when needed
+    workers = max(1, workers or os.cpu_count() or 1)
+    source_hash = content_hash(source)
+    path = source
+    if not source.endswith('.parquet'):
+        path = columnar_path(source)
+        if not is_columnar_current(source):
+            ingest(source, path)
+    runs = split_row_groups(path, workers)
+    if len(runs) == 1:
+        # a single part is summed in this process, there is nothing to share
+        cube = assemble_cube(partial_sums(path, runs[0]))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            cube = assemble_cube(merge_sums(list(pool.map(partial_sums, [path] * len(runs), runs))))
+    write_cube(cube, source_hash, source)
+    return cube, len(runs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the sales cube of the dataset with a pool of processes.')
+    parser.add_argument('--source', default=DATA_PATH, help='csv or parquet file to aggregate')
+    parser.add_argument('--workers', type=positive_int, default=None, help='number of worker processes, one per core by default')
+    args = parser.parse_args()
+    start = time.perf_counter()
+    _, parts = preaggregate(args.source, args.workers)
+    print('cube of {} written in {:.2f} s, {} parts summed'.format(args.source, time.perf_counter() - start, parts))
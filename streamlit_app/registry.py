@@ -0,0 +1,251 @@
+# import the libraries
+import argparse
+import glob
+import hashlib
+import json
+import os
+import pickle
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+
+try:
+    import fcntl
+except ImportError:
+    # no file locks on windows, the processes of a server may then drop each other's entries from the manifest
+    fcntl = None
+
+from data_loader import CLEANING, DATA_PATH, columnar_path, content_hash, is_columnar_current
+from instrumentation import stage
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# the artifacts derived from a dataset are stored in this directory, a folder next to the dataset by default
+ARTIFACTS_VARIABLE = 'VIDEO_GAMES_ARTIFACTS'
+# the datasets of a directory of artifacts, their fingerprint, their cleaning and the keys of their artifacts
+MANIFEST = 'registry.json'
+# locked by the process updating the manifest, the server processes store artifacts at the same time
+MANIFEST_LOCK = 'registry.json.lock'
+# frames stored as uncompressed arrow ipc files and memory mapped when read back: every process serving the same
+# dataset maps the same pages of the page cache instead of holding its own copy of the rows
+ARROW_ARTIFACTS = ('dataset', 'cleaned')
+
+_code_version = None
+
+
+def code_version():
+    # hash of the modules of the app, computed once per process: an artifact built by other code is never read back,
+    # so a deploy of the same code warms from disk and a deploy of new code starts from fresh artifacts
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        for module in sorted(glob.glob(os.path.join(APP_DIR, '*.py'))):
+            with open(module, 'rb') as module_file:
+                digest.update(os.path.basename(module).encode() + b'\0' + module_file.read())
+        _code_version = digest.hexdigest()[:16]
+    return _code_version
+
+
+def artifact_dir(path=DATA_PATH):
+    return os.environ.get(ARTIFACTS_VARIABLE) or os.path.join(os.path.dirname(os.path.abspath(path)), 'artifacts')
+
+
+def artifact_key(name, source_hash):
+    # version key of an artifact: what it is, the exact input it was derived from, the cleaning rules and the code
+    identity = {'artifact': name, 'source': source_hash, 'cleaning': CLEANING, 'code': code_version()}
+    return hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()[:20]
+
+
+def artifact_file(name, key):
+    return '{}-{}.{}'.format(name, key, 'arrow' if name in ARROW_ARTIFACTS else 'pkl')
+
+
+def artifact_path(name, source_hash, path=DATA_PATH):
+    return os.path.join(artifact_dir(path), artifact_file(name, artifact_key(name, source_hash)))
+
+
+def attach_frame(table):
+    # the frame of a table read from a memory map, the columns point at the mapped buffers instead of copies:
+    # the numbers are viewed in place, the categories keep the codes and the dictionary of the file,
+    # only the nullable integers and the codes of labels with missing values are copied
+    labels = [field.name for field in table.schema if pa.types.is_dictionary(field.type)]
+    frame = table.drop_columns(labels).to_pandas(split_blocks=True)
+    for name in labels:
+        column = table.column(name)
+        column = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+        codes = column.indices.fill_null(-1) if column.null_count else column.indices
+        # the dictionary of a file written from categories is unique, checking it again would hash every label
+        dtype = pd.CategoricalDtype._from_fastpath(pd.Index(pd.array(column.dictionary, dtype='str')),
+                                                 column.type.ordered)
+        frame[name] = pd.Categorical.from_codes(codes.to_numpy(), dtype=dtype, validate=False)
+    # back in the order of the file, the index columns are the index of the frame
+    return frame[[name for name in table.column_names if name in frame.columns]]
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return {'datasets': {}}
+
+
+@contextmanager
+def manifest_lock(directory):
+    # held around every read, change and write of the manifest, so a process never writes it back without the
+    # entries another process added meanwhile, which the garbage collection would take for stale artifacts
+    with open(os.path.join(directory, MANIFEST_LOCK), 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def write_manifest(directory, manifest):
+    manifest_path = os.path.join(directory, MANIFEST)
+    temporary_path = '{}.{}.tmp'.format(manifest_path, os.getpid())
+    with open(temporary_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    os.replace(temporary_path, manifest_path)
+
+
+def remove_files(paths):
+    removed = []
+    for path in paths:
+        try:
+            os.remove(path)
+            removed.append(path)
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def register(name, source_hash, path, details=None):
+    # record the artifact under its dataset in the manifest, the artifacts of an older version of the dataset,
+    # or of the same artifact built by older code, are removed as nothing will read them again
+    # called with the lock of the manifest held
+    directory = artifact_dir(path)
+    manifest = read_manifest(directory)
+    dataset = os.path.abspath(path)
+    entry = manifest['datasets'].get(dataset)
+    stale = []
+    if entry is None or entry['source_hash'] != source_hash:
+        if entry is not None:
+            stale = [os.path.join(directory, artifact_file(*artifact)) for artifact in entry['artifacts'].items()]
+        entry = {
+            'source_hash': source_hash,
+            'format': 'parquet' if path.endswith('.parquet') else 'csv',
+            # the parquet copy read in place of the csv when it was ingested from this version
+            'columnar': columnar_path(path) if not path.endswith('.parquet') and is_columnar_current(path) else None,
+            'cleaning': dict(CLEANING),
+            'artifacts': {},
+        }
+    key = artifact_key(name, source_hash)
+    if entry['artifacts'].get(name, key) != key:
+        stale.append(os.path.join(directory, artifact_file(name, entry['artifacts'][name])))
+    entry['artifacts'][name] = key
+    entry['cleaning'].update(details or {})
+    entry['updated'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    manifest['datasets'][dataset] = entry
+    write_manifest(directory, manifest)
+    remove_files(stale)
+
+
+def read_artifact(name, source_hash, path=DATA_PATH):
+    # the artifact derived from this version of the dataset, None when it was never stored
+    target = artifact_path(name, source_hash, path)
+    try:
+        if name in ARROW_ARTIFACTS:
+            # the pages of the file are mapped, not read, and shared with every process mapping the same file
+            return attach_frame(pa.ipc.open_file(pa.memory_map(target)).read_all())
+        with open(target, 'rb') as stored:
+            return pickle.load(stored)
+    except (OSError, pa.ArrowInvalid, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def write_artifact(name, artifact, source_hash, path=DATA_PATH, details=None):
+    # write to a temporary file first so a reader never sees a half written artifact
+    target = artifact_path(name, source_hash, path)
+    temporary_path = '{}.{}.tmp'.format(target, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if name in ARROW_ARTIFACTS:
+            table = pa.Table.from_pandas(artifact)
+            with pa.OSFile(temporary_path, 'wb') as stored, pa.ipc.new_file(stored, table.schema) as writer:
+                writer.write_table(table)
+        else:
+            with open(temporary_path, 'wb') as stored:
+                pickle.dump(artifact, stored, protocol=pickle.HIGHEST_PROTOCOL)
+        # stored and registered under the lock, the garbage collection never sees it stored but unregistered
+        with manifest_lock(os.path.dirname(target)):
+            os.replace(temporary_path, target)
+            register(name, source_hash, path, details)
+    except OSError:
+        # a read only deployment still works, the artifact is just rebuilt on start
+        pass
+
+
+def load_artifact(name, build, path=DATA_PATH):
+    # the artifact of the current version of the dataset: read from disk, or built and stored for the next start
+    source_hash = content_hash(path)
+    with stage('read_artifact/' + name):
+        artifact = read_artifact(name, source_hash, path)
+    if artifact is None:
+        artifact = build()
+        write_artifact(name, artifact, source_hash, path)
+    return artifact
+
+
+def collect_garbage(directory):
+    # remove every artifact that is not of the current version of a registered dataset and built by this code,
+    # with the datasets that no longer exist and the cubes persisted next to the csv by older versions of the app
+    if not os.path.isdir(directory):
+        return []
+    with manifest_lock(directory):
+        return _collect_garbage(directory)
+
+
+def _collect_garbage(directory):
+    manifest = read_manifest(directory)
+    current = set()
+    removed = []
+    for dataset, entry in list(manifest['datasets'].items()):
+        removed += remove_files([os.path.splitext(dataset)[0] + '.cube.pkl'])
+        if not os.path.exists(dataset) or content_hash(dataset) != entry['source_hash']:
+            del manifest['datasets'][dataset]
+            continue
+        entry['artifacts'] = {name: artifact_key(name, entry['source_hash']) for name in entry['artifacts']}
+        current.update(artifact_file(*artifact) for artifact in entry['artifacts'].items())
+    stored = [path for pattern in ('*.pkl', '*.arrow', '*.tmp') for path in glob.glob(os.path.join(directory, pattern))]
+    removed += remove_files([path for path in stored if os.path.basename(path) not in current])
+    write_manifest(directory, manifest)
+    return removed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Show the fingerprint, the cleaning and the artifacts of a dataset, '
+                                                 'and remove the stale artifacts.')
+    parser.add_argument('--path', default=DATA_PATH, help='dataset to show, csv or parquet')
+    parser.add_argument('--gc', action='store_true', help='remove the artifacts of older versions of the datasets')
+    args = parser.parse_args()
+    directory = artifact_dir(args.path)
+    if args.gc:
+        removed = collect_garbage(directory)
+        print('{} stale files removed from {}'.format(len(removed), directory))
+    entry = read_manifest(directory)['datasets'].get(os.path.abspath(args.path))
+    if entry is None:
+        print('no artifact of {} in {}'.format(args.path, directory))
+    else:
+        current = entry['source_hash'] == content_hash(args.path)
+        print('{} ({}), {}version {}'.format(args.path, entry['format'], '' if current else 'stale, ', entry['source_hash']))
+        print('columnar copy: {}'.format(entry['columnar'] or 'none'))
+        print('cleaning: {}'.format(json.dumps(entry['cleaning'], sort_keys=True)))
+        for name, key in sorted(entry['artifacts'].items()):
+            artifact = os.path.join(directory, artifact_file(name, key))
+            size = os.path.getsize(artifact) if os.path.exists(artifact) else None
+            print('  {:<32} {} {}'.format(name, key, 'missing' if size is None else '{:,} bytes'.format(size)))
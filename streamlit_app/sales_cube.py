@@ -0,0 +1,240 @@
+# import the libraries
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data_loader import ANALYSIS_COLUMNS, DATA_PATH, content_hash, drop_incomplete_rows, file_fingerprint, read_dataset
+from dataset_schema import SALES_COLUMNS
+from instrumentation import stage
+from registry import read_artifact, write_artifact
+from top_n import top_positions
+
+# the sales columns and the dimensions the analysis is broken down by
+REGIONS = SALES_COLUMNS
+DIMENSIONS = ['Platform', 'Publisher', 'Genre', 'Name', 'Year_of_Release']
+# the analysis shows the top 20 games, the cube keeps the best selling names of each region up to this limit
+# as there are about as many names as games
+RANKING_LIMITS = {'Name': 1000}
+
+
+def sales_values(video_game):
+    # the sales are stored as float32, round them back to the 2 decimals of the source before summing
+    return video_game[REGIONS].astype('float64').round(2)
+
+
+def dimension_sums(sales, keys):
+    # sum of sales of every region per value of the keys, only the sales columns are ever reduced:
+    # the keys become integer codes and every region is summed with one weighted bincount,
+    # the result has a float64 column per region and the labels found in the rows, in sorted order
+    if isinstance(keys.dtype, pd.CategoricalDtype):
+        codes, labels = keys.cat.codes.to_numpy(), keys.cat.categories
+    else:
+        codes, labels = pd.factorize(keys, sort=True)
+    # the rows without a label are counted in an extra bin which is dropped, like in a groupby
+    codes = np.where(codes < 0, len(labels), codes)
+    present = np.bincount(codes, minlength=len(labels) + 1)[:-1] > 0
+    # plot the labels as plain values rather than categories
+    index = pd.Index(labels, name=keys.name)[present]
+    return pd.DataFrame({region: np.bincount(codes, weights=sales[region].to_numpy(dtype='float64'),
+                                             minlength=len(labels) + 1)[:-1][present]
+                         for region in REGIONS}, index=index)
+
+
+def rank_regions(grouped, limit=None):
+    # the sums of each region sorted by descending sales, as stored in the cube, only the first limit ones
+    # when a limit is given, every region is ranked in one pass and equal sums are ordered by label
+    # the sums are rounded to the 2 decimals of the sales first, so sums that only differ by the order they were
+    # added in are equal and rank by label, whether the cube was built at once, by chunks, by parts or patched
+    values = grouped[REGIONS].to_numpy().round(2)
+    positions = top_positions(values, grouped.index.to_numpy(), limit)
+    return {region: pd.Series(values[rows, column], index=grouped.index[rows], name=region)
+            for column, (region, rows) in enumerate(zip(REGIONS, positions))}
+
+
+def limited_rankings(grouped, limit):
+    # the first limit sums of every region and the floor of every region, the largest sum left out:
+    # the labels missing from a limited ranking have at most the floor
+    ranked = rank_regions(grouped, limit + 1)
+    floors = {region: float(sums.iloc[limit]) if len(sums) > limit else -np.inf for region, sums in ranked.items()}
+    return {region: sums[:limit] for region, sums in ranked.items()}, floors
+
+
+def aggregate_dimension(sales, keys, limit=None):
+    # sum of sales of every region per value of the keys, each region sorted by descending sales
+    return rank_regions(dimension_sums(sales, keys), limit)
+
+
+def median_year(counts):
+    # median of the years from the number of games of every year, rounded like the cleaning of the analysis
+    counts = counts[counts > 0].sort_index()
+    ends = counts.cumsum().to_numpy()
+    years = counts.index.to_numpy(dtype='float64')
+    lower = years[np.searchsorted(ends, (ends[-1] - 1) // 2, side='right')]
+    upper = years[np.searchsorted(ends, ends[-1] // 2, side='right')]
+    return round((lower + upper) / 2)
+
+
+def cube_sums(video_game):
+    # the sums the cube is assembled from, they add up across parts of the rows so they can be computed
+    # by chunks or in worker processes and merged: the totals, the number of games of every known year,
+    # the sales of the games without a year and the sums of every dimension, without those games for the years
+    # video_game holds the rows kept by the cleaning with their missing years
+    years = video_game['Year_of_Release']
+    sales = sales_values(video_game)
+    sums = {'totals': sales.sum(), 'year_counts': years.value_counts().astype('int64'),
+            'missing_sales': sales[years.isna().to_numpy()].sum()}
+    for dimension in DIMENSIONS:
+        sums[dimension] = dimension_sums(sales, video_game[dimension])
+    return sums
+
+
+def merge_sums(parts):
+    # add up the cube sums of several parts of the rows
+    return {key: pd.concat([part[key] for part in parts]).groupby(level=0).sum() for key in parts[0]}
+
+
+def add_missing_years(year_sums, missing_sales, fill):
+    # the games without a year count for the median year, like in the cleaning of the analysis
+    if not missing_sales.any():
+        return year_sums
+    missing = pd.DataFrame([missing_sales[REGIONS]], index=pd.Index([fill], dtype=year_sums.index.dtype,
+                                                                     name=year_sums.index.name))
+    return pd.concat([year_sums, missing]).groupby(level=0).sum()
+
+
+def assemble_cube(sums, ranked=None):
+    # cube[dimension][region] is the sum of sales per value of the dimension, sorted by descending sales,
+    # ranked holds the (rankings, floors) of the limited dimensions that were already ranked,
+    # the cube keeps what the fill of the missing years depends on so it can be moved when rows are appended
+    ranked = ranked or {}
+    counts = sums['year_counts'].astype('int64')
+    years = {'counts': counts[counts > 0], 'fill': median_year(counts), 'missing_sales': sums['missing_sales'][REGIONS]}
+    cube = {'totals': sums['totals'][REGIONS], 'years': years, 'floors': {}}
+    for dimension in DIMENSIONS:
+        if dimension in ranked:
+            cube[dimension], cube['floors'][dimension] = ranked[dimension]
+            continue
+        grouped = sums[dimension]
+        if dimension == 'Year_of_Release':
+            grouped = add_missing_years(grouped, years['missing_sales'], years['fill'])
+        if dimension in RANKING_LIMITS:
+            cube[dimension], cube['floors'][dimension] = limited_rankings(grouped, RANKING_LIMITS[dimension])
+        else:
+            cube[dimension] = rank_regions(grouped)
+    return cube
+
+
+def build_cube(video_game):
+    # one aggregation pass per dimension, every chart of the analysis reads from the result
+    return assemble_cube(cube_sums(video_game))
+
+
+def patch_ranking(ranked, delta):
+    # add the delta to the sums of every label, a label whose rows were all removed has no sales left
+    sums = pd.DataFrame(ranked).add(delta, fill_value=0)
+    # the sales have 2 decimals, rounding drops the noise of the subtractions
+    sums = sums.round(2)
+    emptied = sums.index.isin(delta.index) & (sums == 0).all(axis=1)
+    return rank_regions(sums[~emptied])
+
+
+def patch_limited_ranking(ranked, floors, touched, video_game, dimension):
+    # the sums of the touched labels are summed again from the dataset, the labels missing from the
+    # ranking are not known so a sum falling below the floor leaves the ranking
+    limit = RANKING_LIMITS[dimension]
+    labels = video_game[dimension]
+    rows = labels.isin(touched)
+    totals = dimension_sums(sales_values(video_game[rows]), labels[rows]).round(2)
+    patched, floors = {}, dict(floors)
+    for region in REGIONS:
+        untouched = ranked[region][~ranked[region].index.isin(touched)]
+        merged = pd.concat([untouched, totals[region]])
+        merged = merged[merged >= floors[region]]
+        merged = merged.iloc[top_positions(merged.to_numpy()[:, None], merged.index.to_numpy())[0]]
+        if len(merged) > limit:
+            floors[region] = max(floors[region], float(merged.iloc[limit]))
+        patched[region] = merged
+    if any(len(patched[region]) < limit // 2 and floors[region] > -np.inf for region in REGIONS):
+        # too many labels left the ranking, recompute the whole dimension
+        return limited_rankings(dimension_sums(sales_values(video_game), labels), limit)
+    return {region: sums[:limit] for region, sums in patched.items()}, floors
+
+
+def patch_cube(cube, added, removed, video_game):
+    # update the cube by the delta of the rows added to and removed from the dataset instead of aggregating
+    # everything again, the frames hold rows kept by the cleaning with their missing years,
+    # video_game is the whole updated dataset, only read for the labels of the limited rankings
+    rows = pd.concat([added, removed], ignore_index=True)
+    sales = pd.concat([sales_values(added), -sales_values(removed)], ignore_index=True)
+    # the median year moves with the games added and removed, the sales of the games without a year
+    # are taken off the previous fill year and put on the new one
+    years = cube['years']
+    counts = years['counts'].add(added['Year_of_Release'].value_counts(), fill_value=0)
+    counts = counts.sub(removed['Year_of_Release'].value_counts(), fill_value=0).astype('int64')
+    known = rows['Year_of_Release'].notna().to_numpy()
+    patched_years = {'counts': counts[counts > 0], 'fill': median_year(counts),
+                     'missing_sales': years['missing_sales'] + sales[~known].sum()}
+    patched = {'totals': cube['totals'] + sales.sum(), 'years': patched_years, 'floors': dict(cube['floors'])}
+    for dimension in DIMENSIONS:
+        keys, values = rows[dimension], sales
+        if dimension == 'Year_of_Release':
+            keys = pd.concat([keys[known], pd.Series([patched_years['fill'], years['fill']], dtype=keys.dtype)],
+                             ignore_index=True)
+            values = pd.concat([sales[known], pd.DataFrame([patched_years['missing_sales'], -years['missing_sales']])],
+                               ignore_index=True)
+        # the labels of both frames may not share the same categories, use the dtype of the cube labels
+        keys = keys.astype(cube[dimension][REGIONS[0]].index.dtype)
+        delta = dimension_sums(values, keys)
+        if dimension in RANKING_LIMITS:
+            patched[dimension], patched['floors'][dimension] = patch_limited_ranking(
+                cube[dimension], cube['floors'][dimension], delta.index, video_game, dimension)
+        else:
+            patched[dimension] = patch_ranking(cube[dimension], delta)
+    return patched
+
+
+def read_cube(source_hash, path=DATA_PATH):
+    # the persisted cube of this version of the dataset, None when there is none
+    return read_artifact('cube', source_hash, path)
+
+
+def write_cube(cube, source_hash, path=DATA_PATH):
+    # the cube is stored in the registry with the year the missing years were filled with
+    write_artifact('cube', cube, source_hash, path, {'year_fill_value': cube['years']['fill']})
+
+
+def read_or_build_cube(path=DATA_PATH):
+    # the persisted cube of the current version of the file, built and persisted when there is none
+    source_hash = content_hash(path)
+    with stage('read_cube'):
+        cube = read_cube(source_hash, path)
+    if cube is None:
+        with stage('read_dataset'):
+            video_game = drop_incomplete_rows(read_dataset(path, columns=ANALYSIS_COLUMNS))
+        with stage('build_cube'):
+            cube = build_cube(video_game)
+        write_cube(cube, source_hash, path)
+    return cube
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _load_cube(path, fingerprint):
+    return read_or_build_cube(path)
+
+
+def load_cube(path=DATA_PATH):
+    # the cube is rebuilt only when the csv changes, and shared by every session
+    return _load_cube(path, file_fingerprint(path))
+
+
+def ranking(cube, dimension, region, n=None):
+    # sales of one region per value of the dimension, as a dataframe ready to plot
+    sales = cube[dimension][region]
+    if n is not None:
+        sales = sales[:n]
+    return sales.reset_index()
+
+
+def region_table(cube, dimension):
+    # sales of every region per value of the dimension, ordered by the dimension
+    return pd.DataFrame(cube[dimension]).sort_index().rename_axis(dimension).reset_index()
@@ -0,0 +1,18 @@
+# the modules of the app import each other by name, as when streamlit runs them from streamlit_app
+import os
+import shutil
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    # a copy of the bundled csv with its artifacts in the temporary directory
+    path = str(tmp_path / 'Video_Games.csv')
+    shutil.copy(os.path.join(APP_DIR, 'Data', 'Video_Games.csv'), path)
+    monkeypatch.setenv('VIDEO_GAMES_ARTIFACTS', str(tmp_path / 'artifacts'))
+    return path
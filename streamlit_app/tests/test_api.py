@@ -0,0 +1,85 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+from starlette.requests import Request
+from starlette.routing import Match
+
+from api import create_app, encode, respond
+from data_loader import load_video_games
+from game_entities import GameEntities
+from sales_cube import ranking, read_or_build_cube
+
+ENCODED = encode({'unit': 'millions of copies'})
+ETAG = ENCODED['identity'][0]
+GZIP_ETAG = ENCODED['gzip'][0]
+
+
+def request(**headers):
+    return Request({'type': 'http', 'method': 'GET', 'path': '/api/totals',
+                    'headers': [(name.replace('_', '-').encode(), value.encode()) for name, value in headers.items()]})
+
+
+@pytest.mark.parametrize('if_none_match', [
+    ETAG,
+    'W/' + ETAG,
+    '"other", ' + ETAG,
+    'W/"other",W/' + ETAG,
+    '*',
+])
+def test_known_version_is_not_modified(if_none_match):
+    response = respond(request(if_none_match=if_none_match), ENCODED)
+    assert response.status_code == 304
+    assert response.body == b''
+
+
+@pytest.mark.parametrize('if_none_match', ['', '"other"', 'W/"other", "also-other"', GZIP_ETAG])
+def test_other_version_is_sent(if_none_match):
+    response = respond(request(if_none_match=if_none_match), ENCODED)
+    assert response.status_code == 200
+    assert response.body == ENCODED['identity'][1]
+
+
+@pytest.mark.parametrize('accept_encoding, gzipped', [
+    ('gzip', True),
+    ('deflate, gzip;q=0.5', True),
+    ('*', True),
+    ('gzip;q=0', False),
+    ('gzip; q=0.0, deflate', False),
+    ('*;q=0', False),
+    ('identity', False),
+    ('', False),
+])
+def test_gzip_follows_the_quality(accept_encoding, gzipped):
+    response = respond(request(accept_encoding=accept_encoding), ENCODED)
+    assert ('content-encoding' in response.headers) == gzipped
+    body = gzip.decompress(response.body) if gzipped else response.body
+    assert body == ENCODED['identity'][1]
+
+
+def test_gzip_version_is_not_modified():
+    response = respond(request(accept_encoding='gzip', if_none_match='W/' + GZIP_ETAG), ENCODED)
+    assert response.status_code == 304
+
+
+def get(app, path, **query):
+    # the response of the route of the path, without a server
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'headers': [],
+             'query_string': '&'.join('{}={}'.format(*item) for item in query.items()).encode()}
+    for route in app.routes:
+        matched, child_scope = route.matches(scope)
+        if matched == Match.FULL:
+            scope.update(child_scope)
+            return json.loads(asyncio.run(route.endpoint(Request(scope))).body)
+
+
+def test_games_are_the_entities_of_the_analysis(dataset):
+    app = create_app(dataset)
+    games = get(app, '/api/games', region='EU_Sales', n=5)['values']
+    top = GameEntities().refresh(load_video_games(path=dataset)).top('EU_Sales', 5)
+    assert [game['Name'] for game in games] == list(top['Name'])
+    assert [game['Platforms'] for game in games] == list(top['Platforms'])
+    # the names are ranked by exact name, the sales of a game are split between its platforms
+    names = get(app, '/api/names', region='EU_Sales', n=5)['values']
+    assert names == ranking(read_or_build_cube(dataset), 'Name', 'EU_Sales', 5).to_dict('records')
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+import figures
+from figures import FIGURE_WORKERS_VARIABLE, draw_figures, figure_workers, show_figure, start_figures
+
+
+CORES = os.cpu_count() or 1
+
+
+@pytest.mark.parametrize('value, workers', [('3', 3), ('-2', 1), ('0', CORES), ('', CORES), ('many', CORES)])
+def test_figure_workers(monkeypatch, value, workers):
+    monkeypatch.setenv(FIGURE_WORKERS_VARIABLE, value)
+    assert figure_workers() == workers
+
+
+def test_every_shown_figure_is_drawn(dataset, monkeypatch):
+    drawn = []
+    monkeypatch.setattr(figures, 'plotly_chart', lambda fig, name: drawn.append(name))
+    names = ['sales_by_region', 'region_share', 'platform_sales']
+    start_figures()
+    for name in names:
+        show_figure(name, dataset)
+    draw_figures()
+    assert sorted(drawn) == sorted(names)
+    # nothing is drawn twice
+    draw_figures()
+    assert sorted(drawn) == sorted(names)
+
+
+def test_cached_figures_do_not_wait_in_the_pool(dataset, monkeypatch):
+    monkeypatch.setattr(figures, 'plotly_chart', lambda fig, name: None)
+    start_figures()
+    show_figure('sales_by_region', dataset)
+    draw_figures()
+    # the next run reads the figure on its own thread, even while the pool is busy with other figures
+    monkeypatch.setattr(figures, 'figure_pool', lambda: pytest.fail('a cached figure was sent to the pool'))
+    drawn = []
+    monkeypatch.setattr(figures, 'plotly_chart', lambda fig, name: drawn.append(name))
+    start_figures()
+    show_figure('sales_by_region', dataset)
+    draw_figures()
+    assert drawn == ['sales_by_region']
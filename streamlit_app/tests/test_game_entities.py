@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from append import append_rows
+from data_loader import content_hash, drop_incomplete_rows, read_dataset
+from game_entities import GameEntities, read_game_entities, write_game_entities
+from sales_cube import REGIONS
+
+
+def kept_rows(path):
+    # the rows the entities are built from, like append.py
+    return drop_incomplete_rows(read_dataset(path))
+
+
+def test_refreshed_entities_are_a_full_build(dataset):
+    before = GameEntities().refresh(kept_rows(dataset))
+    write_game_entities(before, content_hash(dataset), dataset)
+    stored = pd.read_csv(dataset)
+    # new games without sales in Japan, equal to many known games there, a new platform and a name variant of
+    # known games, and replaced rows: one moved to another publisher, one left without a publisher so the
+    # cleaning drops it, one with no sales left in Europe
+    added = stored.iloc[[20, 21, 22, 23]].assign(Name=['Zz New Game', 'Aa New Game', 'Wii Sports (JP sales)',
+                                                       'Aa New Game'], Platform=['PS4', 'PS4', 'PC', 'PC'],
+                                         JP_Sales=0.0)
+    replaced = stored.dropna(subset=['Year_of_Release']).iloc[[1, 2, 3]].copy()
+    replaced['Publisher'] = ['Nintendo', np.nan, replaced['Publisher'].iloc[2]]
+    replaced['EU_Sales'] = [replaced['EU_Sales'].iloc[0], replaced['EU_Sales'].iloc[1], 0.0]
+    append_rows(pd.concat([added, replaced]), dataset)
+
+    refreshed = read_game_entities(content_hash(dataset), dataset)
+    built = GameEntities().refresh(kept_rows(dataset))
+    # the ids of the known games never change
+    assert list(refreshed.keys[:len(before.keys)]) == list(before.keys)
+    pd.testing.assert_frame_equal(refreshed.table.set_index('Name').sort_index(),
+                                  built.table.set_index('Name').sort_index())
+    # the rankings are the same, equal sales included
+    for region in REGIONS:
+        assert list(refreshed.top(region)['Name']) == list(built.top(region)['Name']), region
+    games = refreshed.table.set_index('Name')
+    assert games.loc['Wii Sports', 'Platforms'] == 'PC, Wii'
+    assert games.loc['Aa New Game', 'Platforms'] == 'PC, PS4'
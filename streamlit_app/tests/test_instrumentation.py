@@ -0,0 +1,52 @@
+import threading
+import tracemalloc
+
+import pytest
+
+from instrumentation import PROFILE_VARIABLE, finish_run, stage, start_run
+
+
+@pytest.fixture
+def profiled(monkeypatch):
+    monkeypatch.setenv(PROFILE_VARIABLE, '1')
+    yield
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def stopped_run():
+    # a run stopped by a rerun or an exception, its thread ends without finish_run()
+    start_run('Analysis')
+    with stage('figure/sales_by_region'):
+        pass
+
+
+def test_tracing_stops_after_a_stopped_run(profiled):
+    thread = threading.Thread(target=stopped_run)
+    thread.start()
+    thread.join()
+    assert tracemalloc.is_tracing()
+    # the next run of the session is on another thread
+    start_run('Analysis')
+    finish_run()
+    assert not tracemalloc.is_tracing()
+
+
+def test_tracing_goes_on_for_a_run_in_progress(profiled):
+    started, finish = threading.Event(), threading.Event()
+
+    def running():
+        start_run('Data')
+        started.set()
+        finish.wait()
+        finish_run()
+
+    thread = threading.Thread(target=running)
+    thread.start()
+    started.wait()
+    start_run('Analysis')
+    finish_run()
+    assert tracemalloc.is_tracing()
+    finish.set()
+    thread.join()
+    assert not tracemalloc.is_tracing()
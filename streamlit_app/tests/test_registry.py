@@ -0,0 +1,30 @@
+import multiprocessing
+import os
+
+from data_loader import content_hash
+from registry import artifact_dir, artifact_path, collect_garbage, read_manifest, write_artifact
+
+PROCESSES = 4
+ARTIFACTS = 25
+
+
+def store_artifacts(path, process):
+    source_hash = content_hash(path)
+    for artifact in range(ARTIFACTS):
+        write_artifact('figure.{}_{}'.format(process, artifact), artifact, source_hash, path)
+
+
+def test_concurrent_artifacts_are_all_registered(dataset):
+    # the server processes store their artifacts at the same time
+    workers = [multiprocessing.Process(target=store_artifacts, args=(dataset, process)) for process in range(PROCESSES)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    names = ['figure.{}_{}'.format(process, artifact) for process in range(PROCESSES) for artifact in range(ARTIFACTS)]
+    entry = read_manifest(artifact_dir(dataset))['datasets'][os.path.abspath(dataset)]
+    assert sorted(entry['artifacts']) == sorted(names)
+    # none of them is stale
+    assert collect_garbage(artifact_dir(dataset)) == []
+    source_hash = content_hash(dataset)
+    assert all(os.path.exists(artifact_path(name, source_hash, dataset)) for name in names)
@@ -0,0 +1,63 @@
+import argparse
+
+import pandas as pd
+import pytest
+
+from append import append_rows
+from data_loader import ANALYSIS_COLUMNS, content_hash, drop_incomplete_rows
+from dataset_schema import apply_schema
+from ingest import stream_ingest
+from preaggregate import positive_int, preaggregate
+from sales_cube import DIMENSIONS, REGIONS, build_cube, read_cube, write_cube
+
+
+def assert_same_cube(cube, expected):
+    # the same sums in the same order, equal sums included
+    for dimension in DIMENSIONS:
+        for region in REGIONS:
+            pd.testing.assert_series_equal(cube[dimension][region], expected[dimension][region],
+                                           obj='{} {}'.format(dimension, region))
+
+
+@pytest.fixture
+def built_cube(dataset):
+    return build_cube(drop_incomplete_rows(apply_schema(pd.read_csv(dataset))[ANALYSIS_COLUMNS]))
+
+
+def test_stream_ingest_cube_is_build_cube(dataset, built_cube):
+    stream_ingest(dataset, chunksize=2000)
+    assert_same_cube(read_cube(content_hash(dataset), dataset), built_cube)
+
+
+def test_preaggregate_cube_is_build_cube(dataset, built_cube):
+    # the streamed copy has a row group per chunk, so the rows are summed in 4 parts
+    stream_ingest(dataset, chunksize=2000)
+    cube, parts = preaggregate(dataset, 4)
+    assert parts == 4
+    assert_same_cube(cube, built_cube)
+
+
+def test_appended_cube_is_build_cube(dataset, built_cube):
+    stored = pd.read_csv(dataset)
+    dated = stored.dropna(subset=['Name', 'Year_of_Release'])
+    # enough new games of one year to move the median year the games without a year count for
+    added = dated.sample(2000, random_state=0).assign(Name=['New game {}'.format(i) for i in range(2000)],
+                                                      Year_of_Release=2016)
+    undated = dated.sample(20, random_state=1).assign(Name=['Undated game {}'.format(i) for i in range(20)],
+                                                      Year_of_Release=None)
+    # better sales for some of the best selling names and for names at the end of their limited ranking
+    replaced = dated.sort_values('Global_Sales', ascending=False).iloc[[0, 5, 50, 2000, 3000]].copy()
+    replaced[REGIONS] += 0.25
+    write_cube(built_cube, content_hash(dataset), dataset)
+    assert append_rows(pd.concat([added, undated, replaced]), dataset) == (2020, 5)
+    expected = build_cube(drop_incomplete_rows(apply_schema(pd.read_csv(dataset))[ANALYSIS_COLUMNS]))
+    cube = read_cube(content_hash(dataset), dataset)
+    assert cube['years']['fill'] == expected['years']['fill'] != built_cube['years']['fill']
+    pd.testing.assert_series_equal(cube['totals'].round(2), expected['totals'].round(2))
+    assert_same_cube(cube, expected)
+
+
+@pytest.mark.parametrize('value', ['0', '-1', 'all'])
+def test_workers_must_be_positive(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        positive_int(value)
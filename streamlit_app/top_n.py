@@ -0,0 +1,27 @@
+# import the libraries
+import numpy as np
+
+
+def top_positions(values, labels, n=None):
+    # positions of the n largest values of every column of a 2d array, in descending order, every value when n is None
+    # the n-th largest value of all the columns is found in one pass of partial selection instead of a full sort
+    # per column, then only the values above it are ordered, equal values by label so ties are deterministic
+    values = np.asarray(values, dtype='float64')
+    labels = np.asarray(labels)
+    n = len(values) if n is None else min(n, len(values))
+    if n == 0:
+        return [np.empty(0, dtype='int64') for _ in range(values.shape[1])]
+    # missing values never rank, they are sent past every number
+    thresholds = -np.partition(np.nan_to_num(-values, nan=np.inf), n - 1, axis=0)[n - 1]
+    positions = []
+    for column, threshold in enumerate(thresholds):
+        candidates = np.flatnonzero(values[:, column] >= threshold)
+        candidates = candidates[np.argsort(labels[candidates], kind='stable')]
+        positions.append(candidates[np.argsort(-values[candidates, column], kind='stable')][:n])
+    return positions
+
+
+def top_rows(video_game, column, n):
+    # the n rows with the largest values of the column, equal values in the order of the rows
+    values = video_game[column].to_numpy(dtype='float64', na_value=np.nan)
+    return video_game.iloc[top_positions(values[:, None], np.arange(len(values)), n)[0]]
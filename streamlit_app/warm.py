@@ -0,0 +1,103 @@
+# import the libraries
+import argparse
+import json
+import os
+import sys
+import time
+
+from data_loader import DATA_PATH, content_hash, is_columnar_current, load_video_games
+from figures import FIGURES, build_figures, get_figures
+from filter_index import load_filter_index
+from game_entities import load_game_entities
+from ingest import ingest
+from name_search import load_search_index
+from registry import APP_DIR, artifact_dir, code_version
+from sales_cube import load_cube
+
+PAGE_PATH = os.path.join(APP_DIR, 'Analysis.py')
+# written in the directory of the artifacts once every artifact of the dataset is stored,
+# a readiness probe or a start script waits for it before sending traffic to the app
+READY_FILE = 'READY'
+
+
+def ready_path(path=DATA_PATH):
+    return os.path.join(artifact_dir(path), READY_FILE)
+
+
+def is_ready(path=DATA_PATH):
+    # ready when the marker was written for this version of the dataset and of the code
+    try:
+        with open(ready_path(path)) as ready_file:
+            marker = json.load(ready_file)
+    except (OSError, ValueError):
+        return False
+    return marker.get('source_hash') == content_hash(path) and marker.get('code') == code_version()
+
+
+def warm(path=DATA_PATH, log=print):
+    # build, or read back from the registry, everything the pages compute on their first run: the parquet copy,
+    # the frames, the sales cube, the game entities, every figure, the filter and search indexes, then mark it ready
+    # the loaders are the cached ones of the pages, so a server started in this process serves them from memory
+    marker = ready_path(path)
+    try:
+        os.remove(marker)
+    except FileNotFoundError:
+        pass
+    start = time.perf_counter()
+    steps = []
+    if not path.endswith('.parquet') and not is_columnar_current(path):
+        steps.append(('parquet copy', lambda: ingest(path)))
+    steps += [
+        ('dataset', lambda: load_video_games(clean=False, path=path)),
+        ('cleaned dataset', lambda: load_video_games(path=path)),
+        ('sales cube', lambda: load_cube(path)),
+        ('game entities', lambda: load_game_entities(path)),
+    ]
+    # the figures are built at the same time, one process per core, then read in the caches of the pages
+    steps += [
+        ('figures built', lambda: build_figures(FIGURES, path)),
+        ('figures', lambda: list(get_figures(FIGURES, path))),
+    ]
+    steps += [
+        ('filter index', lambda: load_filter_index(path=path)),
+        ('cleaned filter index', lambda: load_filter_index(clean=True, path=path)),
+        ('search index', lambda: load_search_index(path)),
+    ]
+    for label, step in steps:
+        step_start = time.perf_counter()
+        step()
+        log('{:<40} {:8.3f} s'.format(label, time.perf_counter() - step_start))
+    os.makedirs(os.path.dirname(marker), exist_ok=True)
+    with open(marker + '.tmp', 'w') as ready_file:
+        json.dump({'dataset': os.path.abspath(path), 'source_hash': content_hash(path), 'code': code_version(),
+                   'warmed': time.strftime('%Y-%m-%dT%H:%M:%S')}, ready_file, indent=2)
+    os.replace(marker + '.tmp', marker)
+    return time.perf_counter() - start
+
+
+def serve(arguments):
+    # start the app in this process after the warm up: the caches of the pages are already filled,
+    # the first visitor gets the same response times as the next ones
+    from streamlit.web import cli
+    cli.main(['run', PAGE_PATH] + arguments, prog_name='streamlit')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build every artifact of the dataset ahead of the first visitor, '
+                                                 'then mark it ready and optionally start the app.')
+    parser.add_argument('--serve', action='store_true',
+                        help='start the app in this process once warm, the remaining arguments go to streamlit run')
+    parser.add_argument('--check', action='store_true',
+                        help='only tell if the dataset is warm for this code, with the exit status')
+    args, streamlit_arguments = parser.parse_known_args()
+    if streamlit_arguments and not args.serve:
+        parser.error('unrecognized arguments: {}'.format(' '.join(streamlit_arguments)))
+    # the dataset is picked like in the app, VIDEO_GAMES_DATA or the bundled csv
+    if args.check:
+        ready = is_ready()
+        print('{} is {}'.format(DATA_PATH, 'ready' if ready else 'not warm'))
+        sys.exit(0 if ready else 1)
+    seconds = warm()
+    print('{} warmed in {:.2f} s, ready marker written to {}'.format(DATA_PATH, seconds, ready_path()))
+    if args.serve:
+        serve(streamlit_arguments)